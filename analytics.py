@@ -0,0 +1,226 @@
+import json
+import os
+import struct
+import sys
+import threading
+import time
+import zipfile
+from array import array
+from collections import deque
+from datetime import datetime
+
+
+def _npy_bytes(values: list, kind: str) -> bytes:
+    """Encodes a 1-d column in NumPy .npy format ('f' float64, 'i' int64, 'U' unicode)."""
+    if kind == 'f':
+        descr, data = '<f8', array('d', values)
+    elif kind == 'i':
+        descr, data = '<i8', array('q', values)
+    else:
+        width = max([len(value) for value in values] + [1])
+        descr = f'<U{width}'
+        data = b''.join(value.ljust(width, '\0').encode('utf-32-le') for value in values)
+    if not isinstance(data, bytes):
+        if sys.byteorder == 'big':
+            data.byteswap()
+        data = data.tobytes()
+    header = "{'descr': '%s', 'fortran_order': False, 'shape': (%d,), }" % (descr, len(values))
+    # magic + version + header length + header must be a multiple of 64 bytes
+    padding = 64 - (10 + len(header) + 1) % 64
+    header = header + ' ' * (padding % 64) + '\n'
+    return b'\x93NUMPY\x01\x00' + struct.pack('<H', len(header)) + header.encode('latin1') + data
+
+
+def write_npz(path: str, columns: dict):
+    """Writes {name: (kind, values)} as an uncompressed .npz readable by numpy.load."""
+    tmp_path = path + '.tmp'
+    with zipfile.ZipFile(tmp_path, 'w', zipfile.ZIP_STORED) as npz:
+        for name, (kind, values) in columns.items():
+            npz.writestr(f'{name}.npy', _npy_bytes(values, kind))
+    os.replace(tmp_path, path)
+
+
+class PNL_ANALYTICS:
+    """Streaming per-ticker PnL built from fills, flushed to columnar .npz files.
+
+    Fills are converted to yes-contract terms (buying no at q is selling yes
+    at 1 - q) and booked with average-cost accounting, so each fill is an
+    O(1) update and nothing is recomputed from the full fill history.
+    """
+
+    FILL_COLUMNS = [
+        ('ts', 'f'), ('ticker', 'U'), ('side', 'U'), ('action', 'U'), ('count', 'i'),
+        ('yes_price', 'f'), ('fee', 'f'), ('realized_pnl', 'f'),
+    ]
+
+    def __init__(self, directory: str, flush_interval: float = 300, seen_size: int = 10000):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self.tickers = {}
+        self.marks = {}
+        self.last_fill_ts = 0.0
+        self.seen_trade_ids = deque(maxlen=seen_size)
+        self.seen_set = set()
+        self.fill_rows = {name: [] for name, _ in self.FILL_COLUMNS}
+        self.last_flush = time.time()
+        os.makedirs(directory, exist_ok=True)
+        self.state_path = os.path.join(directory, 'state.json')
+        self._load_state()
+
+    def _load_state(self):
+        if not os.path.exists(self.state_path):
+            return
+        with open(self.state_path) as f:
+            state = json.load(f)
+        self.tickers = state['tickers']
+        self.last_fill_ts = state['last_fill_ts']
+        for trade_id in state['seen_trade_ids']:
+            self._remember(trade_id)
+
+    def _remember(self, trade_id: str):
+        if len(self.seen_trade_ids) == self.seen_trade_ids.maxlen:
+            self.seen_set.discard(self.seen_trade_ids[0])
+        self.seen_trade_ids.append(trade_id)
+        self.seen_set.add(trade_id)
+
+    def _ticker_book(self, ticker: str):
+        return self.tickers.setdefault(ticker, {
+            'position': 0, 'avg_price': 0.0, 'realized_pnl': 0.0, 'fees': 0.0, 'incentive_accrued': 0.0,
+        })
+
+    @staticmethod
+    def _fill_yes_price(fill: dict) -> float:
+        if fill.get('yes_price_dollars') is not None:
+            return float(fill['yes_price_dollars'])
+        if fill.get('yes_price') is not None:
+            return float(fill['yes_price']) / 100
+        if fill.get('no_price_dollars') is not None:
+            return 1 - float(fill['no_price_dollars'])
+        return 1 - float(fill.get('no_price', 0)) / 100
+
+    @staticmethod
+    def _fill_ts(fill: dict) -> float:
+        if fill.get('ts') is not None:
+            return float(fill['ts'])
+        created_time = fill.get('created_time')
+        if created_time:
+            return datetime.fromisoformat(created_time.replace('Z', '+00:00')).timestamp()
+        return time.time()
+
+    def on_fill(self, fill: dict):
+        """Books one fill; fills already seen (by trade_id) are ignored."""
+        trade_id = fill.get('trade_id')
+        ticker = fill.get('ticker') or fill.get('market_ticker')
+        with self._lock:
+            if trade_id is not None:
+                if trade_id in self.seen_set:
+                    return
+                self._remember(trade_id)
+
+            count = int(fill.get('count', 0))
+            yes_price = self._fill_yes_price(fill)
+            fee = float(fill.get('fee_cost') or 0)
+            side = fill.get('side', 'yes')
+            action = fill.get('action', 'buy')
+            # buying yes or selling no adds yes contracts
+            signed_count = count if (side == 'yes') == (action == 'buy') else -count
+
+            book = self._ticker_book(ticker)
+            realized = 0.0
+            position = book['position']
+            if position and (position > 0) != (signed_count > 0):
+                closed = min(abs(position), abs(signed_count))
+                direction = 1 if position > 0 else -1
+                realized = (yes_price - book['avg_price']) * closed * direction
+            new_position = position + signed_count
+            if new_position == 0:
+                book['avg_price'] = 0.0
+            elif position == 0 or (position > 0) != (new_position > 0):
+                # opened, or flipped through zero
+                book['avg_price'] = yes_price
+            elif (position > 0) == (signed_count > 0):
+                book['avg_price'] = (book['avg_price'] * abs(position) + yes_price * count) / abs(new_position)
+            book['position'] = new_position
+            book['realized_pnl'] += realized - fee
+            book['fees'] += fee
+
+            ts = self._fill_ts(fill)
+            self.last_fill_ts = max(self.last_fill_ts, ts)
+            row = {
+                'ts': ts, 'ticker': ticker, 'side': side, 'action': action, 'count': count,
+                'yes_price': yes_price, 'fee': fee, 'realized_pnl': realized - fee,
+            }
+            for name, _ in self.FILL_COLUMNS:
+                self.fill_rows[name].append(row[name])
+
+    def accrue_incentive(self, ticker: str, amount: float):
+        with self._lock:
+            book = self._ticker_book(ticker)
+            book['incentive_accrued'] += amount
+
+    def update_marks(self, order_books: dict):
+        """Marks yes positions at the best yes bid (and no positions at 1 - best no bid)."""
+        with self._lock:
+            for ticker, order_book in order_books.items():
+                if ticker not in self.tickers:
+                    continue
+                yes_bids = order_book.get('yes_dollars') or []
+                no_bids = order_book.get('no_dollars') or []
+                position = self.tickers[ticker]['position']
+                if position > 0 and yes_bids:
+                    self.marks[ticker] = max(float(price) for price, _ in yes_bids)
+                elif position < 0 and no_bids:
+                    self.marks[ticker] = 1 - max(float(price) for price, _ in no_bids)
+
+    def unrealized_pnl(self, ticker: str) -> float:
+        book = self.tickers[ticker]
+        if not book['position'] or ticker not in self.marks:
+            return 0.0
+        return (self.marks[ticker] - book['avg_price']) * book['position']
+
+    def summary(self):
+        with self._lock:
+            return {
+                'realized_pnl': sum(book['realized_pnl'] for book in self.tickers.values()),
+                'unrealized_pnl': sum(self.unrealized_pnl(ticker) for ticker in self.tickers),
+                'fees': sum(book['fees'] for book in self.tickers.values()),
+                'incentive_accrued': sum(book['incentive_accrued'] for book in self.tickers.values()),
+            }
+
+    def maybe_flush(self):
+        if time.time() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """Writes buffered fills and a per-ticker PnL snapshot, then checkpoints the state."""
+        with self._lock:
+            stamp = time.strftime("%Y%m%d-%H%M%S")
+            if self.fill_rows['ts']:
+                write_npz(
+                    os.path.join(self.directory, f'fills-{stamp}.npz'),
+                    {name: (kind, self.fill_rows[name]) for name, kind in self.FILL_COLUMNS},
+                )
+                self.fill_rows = {name: [] for name, _ in self.FILL_COLUMNS}
+
+            tickers = sorted(self.tickers)
+            if tickers:
+                write_npz(os.path.join(self.directory, f'pnl-{stamp}.npz'), {
+                    'ticker': ('U', tickers),
+                    'position': ('i', [self.tickers[t]['position'] for t in tickers]),
+                    'avg_price': ('f', [self.tickers[t]['avg_price'] for t in tickers]),
+                    'realized_pnl': ('f', [self.tickers[t]['realized_pnl'] for t in tickers]),
+                    'unrealized_pnl': ('f', [self.unrealized_pnl(t) for t in tickers]),
+                    'fees': ('f', [self.tickers[t]['fees'] for t in tickers]),
+                    'incentive_accrued': ('f', [self.tickers[t]['incentive_accrued'] for t in tickers]),
+                })
+
+            tmp_path = self.state_path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump({
+                    'tickers': self.tickers,
+                    'last_fill_ts': self.last_fill_ts,
+                    'seen_trade_ids': list(self.seen_trade_ids),
+                }, f)
+            os.replace(tmp_path, self.state_path)
+            self.last_flush = time.time()
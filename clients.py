@@ -1,23 +1,104 @@
 import requests
 import base64
+import random
+import threading
 import time
-from typing import Any, Dict, Optional
-from datetime import datetime, timedelta
+import uuid
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
 from enum import Enum
 import json
 
+from requests.adapters import HTTPAdapter
 from requests.exceptions import HTTPError
+from urllib3.util.request import ACCEPT_ENCODING
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 from cryptography.hazmat.primitives import serialization, hashes
 from cryptography.hazmat.primitives.asymmetric import padding, rsa
 from cryptography.exceptions import InvalidSignature
 
-import websockets
+from clock import EXCHANGE_CLOCK
+
+# Compact records: only the fields the bot reads from each response
+INCENTIVE_FIELDS = (
+    'id', 'market_ticker', 'incentive_type', 'paid_out', 'start_date', 'end_date',
+    'period_reward', 'discount_factor_bps', 'target_size',
+)
+MARKET_FIELDS = ('ticker', 'title', 'rules_primary', 'yes_ask_dollars', 'no_ask_dollars', 'volume')
+ORDER_BOOK_FIELDS = ('yes_dollars', 'no_dollars')
+
+def compact_record(record: Optional[Dict[str, Any]], fields: Iterable[str]) -> Dict[str, Any]:
+    """Keeps only the given fields of an API record (missing fields become None)."""
+    record = record or {}
+    return {field: record.get(field) for field in fields}
 
 class Environment(Enum):
     DEMO = "demo"
     PROD = "prod"
 
+class KalshiAPIError(HTTPError):
+    """Error response from the Kalshi API."""
+    retryable = False
+
+    def __init__(self, *args, error_details: Any = None, retry_after: Optional[float] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.error_details = error_details
+        self.retry_after = retry_after
+        self.status_code = self.response.status_code if self.response is not None else None
+
+class KalshiClientError(KalshiAPIError):
+    """4xx response other than 429; retrying will not help."""
+
+class KalshiRateLimitError(KalshiAPIError):
+    """429 response."""
+    retryable = True
+
+class KalshiServerError(KalshiAPIError):
+    """5xx response."""
+    retryable = True
+
+class KalshiCircuitOpenError(KalshiAPIError):
+    """Raised without sending the request while an endpoint's circuit breaker is open."""
+
+class CircuitBreaker:
+    """Per-endpoint circuit breaker that sheds requests after repeated failures."""
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            # half-open: let a single trial request through once the timeout has passed
+            if self.probing or time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self.probing = True
+            return True
+
+    def record_success(self) -> None:
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def record_failure(self) -> None:
+        with self.lock:
+            self.probing = False
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
 class KalshiBaseClient:
     """Base client class for interacting with the Kalshi API."""
     def __init__(
@@ -36,7 +117,9 @@ class KalshiBaseClient:
         self.key_id = key_id
         self.private_key = private_key
         self.environment = environment
-        self.last_api_call = datetime.now()
+        # exchange time for signing; monotonic time for rate limiting and latency
+        self.clock = EXCHANGE_CLOCK()
+        self.last_api_call = time.monotonic()
 
         if self.environment == Environment.DEMO:
             self.HTTP_BASE_URL = "https://demo-api.kalshi.co"
@@ -49,7 +132,7 @@ class KalshiBaseClient:
 
     def request_headers(self, method: str, path: str) -> Dict[str, Any]:
         """Generates the required authentication headers for API requests."""
-        current_time_milliseconds = int(time.time() * 1000)
+        current_time_milliseconds = int(self.clock.now() * 1000)
         timestamp_str = str(current_time_milliseconds)
 
         # Remove query params from path
@@ -85,6 +168,16 @@ class KalshiBaseClient:
 
 class KalshiHttpClient(KalshiBaseClient):
     """Client for handling HTTP connections to the Kalshi API."""
+    MAX_RETRIES = 3
+    # (connect, read) timeouts in seconds
+    REQUEST_TIMEOUT = (3.05, 10)
+    BACKOFF_BASE_SECONDS = 0.5
+    BACKOFF_MAX_SECONDS = 10
+    BREAKER_FAILURE_THRESHOLD = 5
+    BREAKER_RESET_SECONDS = 30
+    MAX_WORKERS = 8
+    LATENCY_SMOOTHING = 0.2
+
     def __init__(
         self,
         key_id: str,
@@ -96,28 +189,122 @@ class KalshiHttpClient(KalshiBaseClient):
         self.exchange_url = "/trade-api/v2/exchange"
         self.markets_url = "/trade-api/v2/markets"
         self.portfolio_url = "/trade-api/v2/portfolio"
+        self.circuit_breakers: Dict[str, CircuitBreaker] = {}
+        # one pooled session and one rate limiter shared by every worker thread
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.MAX_WORKERS, pool_maxsize=self.MAX_WORKERS)
+        self.session.mount("https://", adapter)
+        # gzip/deflate, plus br and zstd when brotli/zstandard are installed
+        self.session.headers["Accept-Encoding"] = ACCEPT_ENCODING
+        self.rate_limit_lock = threading.Lock()
+        self.executor_lock = threading.Lock()
+        self.executor = None
+        # endpoint -> exponentially weighted round-trip time in seconds
+        self.latencies: Dict[str, float] = {}
+        self.latency_lock = threading.Lock()
 
     def get_positions(self) -> Dict[str, Any]:
         """Retrieves the account positions."""
         return self.get(self.portfolio_url + '/positions')
 
-    def get_fills(self) -> Dict[str, Any]:
+    def get_fills(
+        self,
+        ticker: Optional[str] = None,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        min_ts: Optional[int] = None,
+        max_ts: Optional[int] = None,
+    ) -> Dict[str, Any]:
         """Retrieves the account fills."""
-        return self.get(self.portfolio_url + '/fills')
+        params = {
+            'ticker': ticker,
+            'limit': limit,
+            'cursor': cursor,
+            'min_ts': min_ts,
+            'max_ts': max_ts,
+        }
+        params = {k: v for k, v in params.items() if v is not None}
+        return self.get(self.portfolio_url + '/fills', params=params)
+
+    def iter_fills(self, min_ts: Optional[int] = None, limit: int = 1000) -> Iterable[Dict[str, Any]]:
+        """Yields every fill since min_ts, following the pagination cursor."""
+        cursor = None
+        while True:
+            response = self.get_fills(limit=limit, cursor=cursor, min_ts=min_ts)
+            yield from response.get('fills', [])
+            cursor = response.get('cursor')
+            if not cursor:
+                return
 
     def rate_limit(self) -> None:
-        """Built-in rate limiter to prevent exceeding API rate limits."""
+        """Built-in rate limiter to prevent exceeding API rate limits.
+
+        Thread-safe: concurrent callers are spaced out one at a time.
+        """
         THRESHOLD_IN_MILLISECONDS = 100
-        now = datetime.now()
-        threshold_in_microseconds = 1000 * THRESHOLD_IN_MILLISECONDS
-        threshold_in_seconds = THRESHOLD_IN_MILLISECONDS / 1000
-        if now - self.last_api_call < timedelta(microseconds=threshold_in_microseconds):
-            time.sleep(threshold_in_seconds)
-        self.last_api_call = datetime.now()
+        with self.rate_limit_lock:
+            threshold_in_seconds = THRESHOLD_IN_MILLISECONDS / 1000
+            elapsed = time.monotonic() - self.last_api_call
+            if elapsed < threshold_in_seconds:
+                time.sleep(threshold_in_seconds - elapsed)
+            self.last_api_call = time.monotonic()
+
+    def record_latency(self, key: str, seconds: float) -> None:
+        with self.latency_lock:
+            previous = self.latencies.get(key)
+            if previous is None:
+                self.latencies[key] = seconds
+            else:
+                self.latencies[key] = previous + self.LATENCY_SMOOTHING * (seconds - previous)
+
+    def get_latencies(self) -> Dict[str, float]:
+        """Returns the smoothed round-trip time of each endpoint in milliseconds."""
+        with self.latency_lock:
+            return {key: seconds * 1000 for key, seconds in self.latencies.items()}
+
+    def map(self, fn: Callable[[Any], Any], items: Iterable[Any]) -> List[Any]:
+        """Calls fn on each item concurrently on the client's bounded thread pool.
+
+        Results keep the order of items; a call that raises yields its
+        exception in place of a result.
+        """
+        with self.executor_lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=self.MAX_WORKERS, thread_name_prefix="kalshi-http")
+
+        def call(item):
+            try:
+                return fn(item)
+            except Exception as e:
+                return e
+
+        return list(self.executor.map(call, items))
+
+    def parse_retry_after(self, response: requests.Response) -> Optional[float]:
+        """Returns the Retry-After header in seconds, if present."""
+        retry_after = response.headers.get("Retry-After")
+        if retry_after is None:
+            return None
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            pass
+        try:
+            retry_at = parsedate_to_datetime(retry_after)
+        except (TypeError, ValueError):
+            return None
+        return max(0.0, retry_at.timestamp() - self.clock.now())
+
+    @staticmethod
+    def decode(response: requests.Response) -> Any:
+        """Parses a JSON response body, with orjson when it is installed."""
+        if orjson is not None:
+            return orjson.loads(response.content)
+        return response.json()
 
     def raise_if_bad_response(self, response: requests.Response) -> None:
-        """Raises an HTTPError if the response status code indicates an error."""
-        if response.status_code not in range(200, 299):
+        """Raises a KalshiAPIError if the response status code indicates an error."""
+        if response.status_code not in range(200, 300):
             # Capture error details for debugging
             error_details = None
             try:
@@ -131,41 +318,101 @@ class KalshiHttpClient(KalshiBaseClient):
             
             # Store error details in response for better error handling
             response._error_details = error_details
-            
-            response.raise_for_status()
 
-    def post(self, path: str, body: dict) -> Any:
-        """Performs an authenticated POST request to the Kalshi API."""
-        self.rate_limit()
-        response = requests.post(
-            self.host + path,
-            json=body,
-            headers=self.request_headers("POST", path)
+            if response.status_code == 429:
+                error_class = KalshiRateLimitError
+            elif response.status_code >= 500:
+                error_class = KalshiServerError
+            else:
+                error_class = KalshiClientError
+            raise error_class(
+                f"{response.status_code} Error for url: {response.url} | {error_msg}",
+                response=response,
+                error_details=error_details,
+                retry_after=self.parse_retry_after(response),
+            )
+
+    @staticmethod
+    def endpoint_key(method: str, path: str) -> str:
+        """Groups requests by endpoint, replacing tickers and order IDs in the path."""
+        parts = path.split('?')[0].strip('/').split('/')
+        for i in range(2, len(parts)):
+            if any(c.isdigit() or c.isupper() for c in parts[i]):
+                parts[i] = '{id}'
+        return method + ' /' + '/'.join(parts)
+
+    def backoff_delay(self, attempt: int, error: Optional[KalshiAPIError] = None) -> float:
+        """Full-jitter exponential backoff, honoring Retry-After when the server sends it."""
+        if error is not None and error.retry_after is not None:
+            return min(error.retry_after, self.BACKOFF_MAX_SECONDS)
+        return random.uniform(0, min(self.BACKOFF_MAX_SECONDS, self.BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+    def request(self, method: str, path: str, params: Optional[Dict[str, Any]] = None,
+                body: Optional[dict] = None, retry: bool = True) -> Any:
+        """Performs an authenticated request, retrying transient failures.
+
+        Only requests that are safe to repeat should pass retry=True; order
+        creation is made safe by sending a client_order_id.
+        """
+        key = self.endpoint_key(method, path)
+        breaker = self.circuit_breakers.setdefault(
+            key, CircuitBreaker(self.BREAKER_FAILURE_THRESHOLD, self.BREAKER_RESET_SECONDS)
         )
-        self.raise_if_bad_response(response)
-        return response.json()
+        attempts = self.MAX_RETRIES + 1 if retry else 1
+        for attempt in range(attempts):
+            if not breaker.allow():
+                raise KalshiCircuitOpenError(f"Circuit open for {key}")
+            self.rate_limit()
+            try:
+                headers = self.request_headers(method, path)
+                sent_at = time.time()
+                started = time.monotonic()
+                response = self.session.request(
+                    method,
+                    self.host + path,
+                    json=body,
+                    params=params,
+                    headers=headers,
+                    timeout=self.REQUEST_TIMEOUT,
+                )
+                self.record_latency(key, time.monotonic() - started)
+                self.clock.observe(response.headers.get("Date"), sent_at, time.time())
+                self.raise_if_bad_response(response)
+            except (KalshiRateLimitError, KalshiServerError) as e:
+                breaker.record_failure()
+                if attempt == attempts - 1:
+                    raise
+                delay = self.backoff_delay(attempt, e)
+            except KalshiClientError:
+                # the endpoint answered; only the request itself was rejected
+                breaker.record_success()
+                raise
+            except (requests.ConnectionError, requests.Timeout) as e:
+                breaker.record_failure()
+                if attempt == attempts - 1:
+                    raise
+                delay = self.backoff_delay(attempt)
+            except Exception:
+                # never leave a half-open probe in flight
+                breaker.record_failure()
+                raise
+            else:
+                breaker.record_success()
+                return self.decode(response)
+            print(f"Retrying {key} in {delay:.2f}s (attempt {attempt + 1}/{attempts - 1})")
+            time.sleep(delay)
+
+    def post(self, path: str, body: dict, retry: bool = False) -> Any:
+        """Performs an authenticated POST request to the Kalshi API."""
+        return self.request("POST", path, body=body, retry=retry)
 
     def get(self, path: str, params: Dict[str, Any] = {}) -> Any:
         """Performs an authenticated GET request to the Kalshi API."""
-        self.rate_limit()
-        response = requests.get(
-            self.host + path,
-            headers=self.request_headers("GET", path),
-            params=params
-        )
-        self.raise_if_bad_response(response)
-        return response.json()
+        return self.request("GET", path, params=params)
 
     def delete(self, path: str, params: Dict[str, Any] = {}) -> Any:
         """Performs an authenticated DELETE request to the Kalshi API."""
-        self.rate_limit()
-        response = requests.delete(
-            self.host + path,
-            headers=self.request_headers("DELETE", path),
-            params=params
-        )
-        self.raise_if_bad_response(response)
-        return response.json()
+        return self.request("DELETE", path, params=params)
 
     def get_balance(self) -> Dict[str, Any]:
         """Retrieves the account balance."""
@@ -196,19 +443,32 @@ class KalshiHttpClient(KalshiBaseClient):
         return self.get(self.markets_url + '/trades', params=params)
 
 
-    def get_market_incentive(self):
+    def get_market_incentive(self, compact: bool = True):
         """Retrieves market data for a given market ID."""
-        return self.get(f"/trade-api/v2/incentive_programs")
+        response = self.get(f"/trade-api/v2/incentive_programs")
+        if compact:
+            response['incentive_programs'] = [
+                compact_record(incentive, INCENTIVE_FIELDS) for incentive in response.get('incentive_programs') or []
+            ]
+        return response
 
 
-    def get_market_ticker(self, ticker: Optional[str] = None):
+    def get_market_ticker(self, ticker: Optional[str] = None, compact: bool = True):
         """Retrieves tickers for all markets."""
-        return self.get(self.markets_url + '/' + ticker)
+        response = self.get(self.markets_url + '/' + ticker)
+        if compact:
+            response['market'] = compact_record(response.get('market'), MARKET_FIELDS)
+        return response
 
 
-    def get_market_ticker_order_book(self, ticker: Optional[str] = None):
-        """Retrieves order book for a given market."""
-        return self.get(self.markets_url + '/' + ticker + '/orderbook')
+    def get_market_ticker_order_book(self, ticker: Optional[str] = None, depth: Optional[int] = None,
+                                     compact: bool = True):
+        """Retrieves order book for a given market, limited to the best `depth` levels per side if given."""
+        params = {'depth': depth} if depth else {}
+        response = self.get(self.markets_url + '/' + ticker + '/orderbook', params=params)
+        if compact:
+            response['orderbook'] = compact_record(response.get('orderbook'), ORDER_BOOK_FIELDS)
+        return response
 
 
     def get_open_orders(self) -> Dict[str, Any]:
@@ -225,9 +485,11 @@ class KalshiHttpClient(KalshiBaseClient):
           no_price_dollars: Optional[str] = None,  
           time_in_force: Optional[str] = None,
           expiration_ts: Optional[int] = None,
+          client_order_id: Optional[str] = None,
         ):
         """Creates an open order for a given market."""
         playload = {
+            "client_order_id": client_order_id or str(uuid.uuid4()),
             "ticker": ticker, 
             "side": side,    
             "action": action,
@@ -241,7 +503,31 @@ class KalshiHttpClient(KalshiBaseClient):
         # Remove None values to avoid API errors
         playload = {k: v for k, v in playload.items() if v is not None}
         # print(f"THE PLAYLOAD: {playload}")
-        return self.post(self.portfolio_url + '/orders', body=playload)
+        return self.post_order(playload)
+
+    def post_order(self, playload: dict) -> Dict[str, Any]:
+        """Submits one order, retrying with its client_order_id.
+
+        When an earlier attempt reached the exchange the retry is rejected as a
+        duplicate (409); the order it created is looked up and returned instead.
+        """
+        try:
+            return self.post(self.portfolio_url + '/orders', body=playload, retry=True)
+        except KalshiClientError as e:
+            if e.status_code != 409:
+                raise
+            order = self.find_order(playload['ticker'], playload['client_order_id'])
+            if order is None:
+                raise
+            return {'order': order}
+
+    def find_order(self, ticker: str, client_order_id: str) -> Optional[Dict[str, Any]]:
+        """Returns the order on the ticker with the given client_order_id, if any."""
+        response = self.get(self.portfolio_url + '/orders', params={'ticker': ticker})
+        for order in response.get('orders', []):
+            if order.get('client_order_id') == client_order_id:
+                return order
+        return None
 
 
     def close_open_position_order(self, 
@@ -254,9 +540,11 @@ class KalshiHttpClient(KalshiBaseClient):
             no_price_dollars: Optional[str] = None,
             time_in_force: Optional[str] = None,
             reduce_only: Optional[bool] = None,
+            client_order_id: Optional[str] = None,
         ):
         """Closes an open position by creating an order."""
         playload = {
+            "client_order_id": client_order_id or str(uuid.uuid4()),
             "ticker": ticker, 
             "side": side,    
             "action": action,
@@ -268,7 +556,25 @@ class KalshiHttpClient(KalshiBaseClient):
             "reduce_only": reduce_only,
         }
         playload = {k: v for k, v in playload.items() if v is not None}
-        return self.post(self.portfolio_url + '/orders', body=playload)
+        return self.post_order(playload)
+
+    def batch_create_orders(self, orders: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Creates several orders in batched requests of at most 20 orders."""
+        fields = [
+            "client_order_id", "ticker", "side", "action", "count", "type", "yes_price_dollars",
+            "no_price_dollars", "time_in_force", "expiration_ts", "reduce_only",
+        ]
+        responses = []
+        for i in range(0, len(orders), 20):
+            batch = [
+                {k: order[k] for k in fields if order.get(k) is not None}
+                for order in orders[i:i + 20]
+            ]
+            # client_order_id makes the batch safe to retry
+            for order in batch:
+                order.setdefault("client_order_id", str(uuid.uuid4()))
+            responses.extend(self.post(self.portfolio_url + '/orders/batched', body={"orders": batch}, retry=True)['orders'])
+        return {"orders": responses}
 
     def cancel_open_order(self, order_id: Optional[str] = None):
         """Cancels an open order for a given market."""
@@ -286,14 +592,20 @@ class KalshiWebSocketClient(KalshiBaseClient):
         key_id: str,
         private_key: rsa.RSAPrivateKey,
         environment: Environment = Environment.DEMO,
+        channels: Optional[List[str]] = None,
+        message_handler: Optional[Callable[[str], Any]] = None,
     ):
         super().__init__(key_id, private_key, environment)
         self.ws = None
         self.url_suffix = "/trade-api/ws/v2"
         self.message_id = 1  # Add counter for message IDs
+        self.channels = channels if channels is not None else ["ticker"]
+        self.message_handler = message_handler
 
     async def connect(self):
         """Establishes a WebSocket connection using authentication."""
+        import websockets
+
         host = self.WS_BASE_URL + self.url_suffix
         auth_headers = self.request_headers("GET", self.url_suffix)
         async with websockets.connect(host, additional_headers=auth_headers) as websocket:
@@ -304,22 +616,28 @@ class KalshiWebSocketClient(KalshiBaseClient):
     async def on_open(self):
         """Callback when WebSocket connection is opened."""
         print("WebSocket connection opened.")
-        await self.subscribe_to_tickers()
+        await self.subscribe(self.channels)
 
-    async def subscribe_to_tickers(self):
-        """Subscribe to ticker updates for all markets."""
+    async def subscribe(self, channels: List[str]):
+        """Subscribe to the given channels."""
         subscription_message = {
             "id": self.message_id,
             "cmd": "subscribe",
             "params": {
-                "channels": ["ticker"]
+                "channels": channels
             }
         }
         await self.ws.send(json.dumps(subscription_message))
         self.message_id += 1
 
+    async def subscribe_to_tickers(self):
+        """Subscribe to ticker updates for all markets."""
+        await self.subscribe(["ticker"])
+
     async def handler(self):
         """Handle incoming messages."""
+        import websockets
+
         try:
             async for message in self.ws:
                 await self.on_message(message)
@@ -330,7 +648,13 @@ class KalshiWebSocketClient(KalshiBaseClient):
 
     async def on_message(self, message):
         """Callback for handling incoming messages."""
-        print("Received message:", message)
+        if self.message_handler is not None:
+            try:
+                self.message_handler(message)
+            except Exception as e:
+                print("WebSocket message handler error:", e)
+        else:
+            print("Received message:", message)
 
     async def on_error(self, error):
         """Callback for handling errors."""
@@ -0,0 +1,59 @@
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+
+class EXCHANGE_CLOCK:
+    """Estimates the exchange clock from the Date header of API responses.
+
+    A Date header only has one-second resolution, so each response bounds
+    the offset (exchange - local) to [date - received, date + 1 - sent]. The
+    bounds of recent responses are intersected and their midpoint is used;
+    when they stop overlapping (the local clock was stepped) the window
+    restarts from the latest response.
+    """
+
+    __instance = None
+
+    def __new__(cls):
+        if cls.__instance is None:
+            cls.__instance = super(EXCHANGE_CLOCK, cls).__new__(cls)
+            cls.__instance._lock = threading.Lock()
+            cls.__instance.bounds = deque(maxlen=64)
+            cls.__instance.offset = 0.0
+            cls.__instance.synced = False
+        return cls.__instance
+
+    def observe(self, date_header: str, sent_at: float, received_at: float):
+        """Refines the offset from a response Date header and the local send/receive times."""
+        if not date_header:
+            return
+        try:
+            server_time = parsedate_to_datetime(date_header).timestamp()
+        except (TypeError, ValueError):
+            return
+        lower = server_time - received_at
+        upper = server_time + 1 - sent_at
+        with self._lock:
+            self.bounds.append((lower, upper))
+            low = max(bound[0] for bound in self.bounds)
+            high = min(bound[1] for bound in self.bounds)
+            if low > high:
+                self.bounds.clear()
+                self.bounds.append((lower, upper))
+                low, high = lower, upper
+            self.offset = (low + high) / 2
+            self.synced = True
+
+    def get_offset(self) -> float:
+        """Returns the estimated exchange - local clock offset in seconds."""
+        return self.offset
+
+    def now(self) -> float:
+        """Returns the exchange time as a UTC epoch timestamp."""
+        return time.time() + self.offset
+
+    def now_datetime(self) -> datetime:
+        return datetime.fromtimestamp(self.now(), timezone.utc)
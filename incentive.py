@@ -1,4 +1,7 @@
-from datetime import datetime, timedelta
+import heapq
+from datetime import datetime, timezone
+
+from clock import EXCHANGE_CLOCK
 
 class INCENTIVE_PROGRAM:
 
@@ -15,6 +18,13 @@ class INCENTIVE_PROGRAM:
         if cls.__instance is None:
             cls.__instance = super(INCENTIVE_PROGRAM, cls).__new__(cls)
             cls.__instance.trade_incentive_dict = {}
+            # ticker -> active liquidity program, plus heaps of (timestamp, id, ticker)
+            cls.__instance.incentive_index = {}
+            cls.__instance.pending_incentives = {}
+            # program id -> scheduled program; heap entries of dropped or rescheduled programs are stale
+            cls.__instance.programs = {}
+            cls.__instance.start_heap = []
+            cls.__instance.expiry_heap = []
         return cls.__instance
 
     @property
@@ -36,69 +46,168 @@ class INCENTIVE_PROGRAM:
     def load_market_incentive(self, open_incentive_dict: dict):
         self.open_incentive_dict = {}
         self.open_incentive_dict = open_incentive_dict
+        listed_ids = {incentive['id'] for incentive in open_incentive_dict}
+        # programs that left the listing are no longer incentivized
+        for incentive_id in [incentive_id for incentive_id in self.programs if incentive_id not in listed_ids]:
+            self._drop(incentive_id)
+        for incentive in open_incentive_dict:
+            self._index_incentive(incentive)
+
+    @staticmethod
+    def _schedule_key(incentive: dict):
+        return (incentive['market_ticker'], incentive['incentive_type'], incentive['paid_out'],
+                incentive['start_date'], incentive['end_date'])
+
+    def _index_incentive(self, incentive: dict):
+        """Adds a liquidity program to the ticker index and schedules its start and expiry."""
+        program = self.programs.get(incentive['id'])
+        if program is not None:
+            if self._schedule_key(program['incentive']) == self._schedule_key(incentive):
+                program['incentive'] = incentive
+                return
+            # rescheduled or paid out; its old heap entries are skipped when popped
+            self._drop(incentive['id'])
+        if incentive['paid_out'] != False or incentive['incentive_type'] != 'liquidity':
+            return
+
+        start_ts = self._timestamp(incentive['start_date'])
+        # stop trading STOP_TRADE_TIME seconds before the program ends
+        expiry_ts = self._timestamp(incentive['end_date']) - self.__stop_trade_time
+        now = EXCHANGE_CLOCK().now()
+        if expiry_ts <= now:
+            return
+        ticker = incentive['market_ticker']
+        program = {
+            'incentive': incentive,
+            'ticker': ticker,
+            'start_ts': start_ts,
+            'expiry_ts': expiry_ts,
+        }
+        self.programs[incentive['id']] = program
+        heapq.heappush(self.expiry_heap, (expiry_ts, incentive['id'], ticker))
+        if start_ts > now:
+            heapq.heappush(self.start_heap, (start_ts, incentive['id'], ticker))
+            self.pending_incentives[incentive['id']] = program
+        else:
+            self._activate(ticker, program)
+
+    def _drop(self, incentive_id: str):
+        """Forgets a program, handing its ticker to another started program if there is one."""
+        program = self.programs.pop(incentive_id, None)
+        if program is None:
+            return
+        self.pending_incentives.pop(incentive_id, None)
+        ticker = program['ticker']
+        if self.incentive_index.get(ticker) is not program:
+            return
+        self.incentive_index.pop(ticker)
+        self.trade_incentive_dict.pop(ticker, None)
+        for other_id, other in self.programs.items():
+            if other['ticker'] == ticker and other_id not in self.pending_incentives:
+                self._activate(ticker, other)
+
+    def _timestamp(self, date_str: str) -> float:
+        date = self._parse_iso_datetime(date_str)
+        if date.tzinfo is None:
+            date = date.replace(tzinfo=timezone.utc)
+        return date.timestamp()
+
+    def _activate(self, ticker: str, program: dict):
+        # keep the program that runs the longest when a ticker has several
+        current = self.incentive_index.get(ticker)
+        if current is None or current['expiry_ts'] < program['expiry_ts']:
+            self.incentive_index[ticker] = program
+
+    def process_events(self, now: float = None):
+        """Activates started programs and expires ended ones, returning the expired tickers.
+
+        Program times are compared against the exchange clock.
+        """
+        now = EXCHANGE_CLOCK().now() if now is None else now
+        while self.start_heap and self.start_heap[0][0] <= now:
+            start_ts, incentive_id, ticker = heapq.heappop(self.start_heap)
+            program = self.pending_incentives.get(incentive_id)
+            if program is None or program['start_ts'] != start_ts:
+                continue
+            self.pending_incentives.pop(incentive_id)
+            if program['expiry_ts'] > now:
+                self._activate(ticker, program)
+
+        expired_tickers = []
+        while self.expiry_heap and self.expiry_heap[0][0] <= now:
+            expiry_ts, incentive_id, ticker = heapq.heappop(self.expiry_heap)
+            program = self.programs.get(incentive_id)
+            if program is None or program['expiry_ts'] != expiry_ts:
+                continue
+            self.programs.pop(incentive_id)
+            self.pending_incentives.pop(incentive_id, None)
+            if self.incentive_index.get(ticker) is program:
+                self.incentive_index.pop(ticker)
+                self.trade_incentive_dict.pop(ticker, None)
+                expired_tickers.append(ticker)
+        return expired_tickers
+
+    def next_event_time(self):
+        """Returns the exchange timestamp of the next program start or expiry, if any."""
+        times = [heap[0][0] for heap in (self.start_heap, self.expiry_heap) if heap]
+        return min(times) if times else None
+
+    def is_incentivized(self, ticker: str):
+        return ticker in self.incentive_index
+
+    def get_program_duration(self, ticker: str):
+        """Returns the length in seconds of the ticker's active program, or None."""
+        program = self.incentive_index.get(ticker)
+        if program is None:
+            return None
+        return program['expiry_ts'] + self.__stop_trade_time - program['start_ts']
 
     def get_open_incentive_tickers(self):
         if not self.open_incentive_dict:
             raise ValueError("Trade self.open_incentive_dict is not set")
-        
-        ticker_list = []
-        for incentive in self.open_incentive_dict:
-            ticker_list.append(incentive['market_ticker'])
-        return ticker_list
+
+        self.process_events()
+        return list(self.incentive_index.keys())
 
     def fill_incentive_tickers(self, ticker_dict: dict):
         # ticker_dict in market key.
         self.trade_incentive_dict = {}
 
         try:
-            for incentive in self.open_incentive_dict:
-                if incentive['market_ticker'] in ticker_dict:
-                    end_date = self._parse_iso_datetime(incentive['end_date'])
-                    # Convert to naive datetime for comparison if timezone-aware
-                    end_date_naive = end_date.replace(tzinfo=None) if end_date.tzinfo else end_date
-                    # Allow 5 minutes leeway for the timestamp comparison
-                    curr_date_time = datetime.now() - timedelta(seconds=self.__stop_trade_time)
-                    if incentive['paid_out'] == False and end_date_naive > curr_date_time and incentive['incentive_type'] == 'liquidity':
-                        curr_ticker = incentive['market_ticker']
-                        # if abs(float(ticker_dict[curr_ticker]['yes_ask_dollars'])) <= self.__trade_price_limit or abs(float(ticker_dict[curr_ticker]['no_ask_dollars'])) <= self.__trade_price_limit:
-                        #     continue
-                        # else:
-                        if incentive['target_size'] is None or ticker_dict[curr_ticker]['yes_ask_dollars'] is None or ticker_dict[curr_ticker]['no_ask_dollars'] is None or ticker_dict[curr_ticker]['volume'] is None:
-                            continue
-                        else:
-                            # yes_book = self._reverse_cum(ticker_dict[curr_ticker]['yes_ask_dollars'])
-                            # no_book = self._reverse_cum(ticker_dict[curr_ticker]['no_ask_dollars'])
-                            # yes_idx = self._find_the_last_price_and_qty(yes_book, incentive['target_size'])
-                            # no_idx = self._find_the_last_price_and_qty(no_book, incentive['target_size'])
-                            # yes_price = float(yes_book[yes_idx][0])
-                            # no_price = float(no_book[no_idx][0])
-                            # if yes_price > self.__trade_price_limit and no_price > self.__trade_price_limit:
-                            #     continue
-
-                            yes_ask_dollars = float(ticker_dict[curr_ticker]['yes_ask_dollars'])
-                            no_ask_dollars = float(ticker_dict[curr_ticker]['no_ask_dollars'])
-                            volume = float(ticker_dict[curr_ticker]['volume'])
-                            spread = abs(yes_ask_dollars - no_ask_dollars)
-                            # max_loss_dollars = (yes_ask_dollars + no_ask_dollars - notional_value_dollars) * float(incentive['target_size'])
-                            tmp_dict = {
-                                'ticker': curr_ticker,
-                                'start_date': incentive['start_date'],
-                                'discount_factor_bps': incentive['discount_factor_bps'],
-                                'end_date': incentive['end_date'],
-                                'id': incentive['id'],
-                                'title': ticker_dict[curr_ticker]['title'],
-                                'rules_primary': ticker_dict[curr_ticker]['rules_primary'],
-                                'incentive_type': incentive['incentive_type'],
-                                'paid_out': incentive['paid_out'],
-                                'period_reward': incentive['period_reward'],
-                                'target_size': incentive['target_size'],
-                                'yes_ask_dollars': yes_ask_dollars,
-                                'no_ask_dollars': no_ask_dollars,
-                                'volume': volume,
-                                'spread': spread,
-                                # 'max_loss_dollars': max_loss_dollars
-                            }
-                            self.trade_incentive_dict[incentive['market_ticker']] = tmp_dict
+            self.process_events()
+            for curr_ticker, program in self.incentive_index.items():
+                if curr_ticker in ticker_dict:
+                    incentive = program['incentive']
+                    # if abs(float(ticker_dict[curr_ticker]['yes_ask_dollars'])) <= self.__trade_price_limit or abs(float(ticker_dict[curr_ticker]['no_ask_dollars'])) <= self.__trade_price_limit:
+                    #     continue
+                    # else:
+                    if incentive['target_size'] is None or ticker_dict[curr_ticker]['yes_ask_dollars'] is None or ticker_dict[curr_ticker]['no_ask_dollars'] is None or ticker_dict[curr_ticker]['volume'] is None:
+                        continue
+                    else:
+                        yes_ask_dollars = float(ticker_dict[curr_ticker]['yes_ask_dollars'])
+                        no_ask_dollars = float(ticker_dict[curr_ticker]['no_ask_dollars'])
+                        volume = float(ticker_dict[curr_ticker]['volume'])
+                        spread = abs(yes_ask_dollars - no_ask_dollars)
+                        # max_loss_dollars = (yes_ask_dollars + no_ask_dollars - notional_value_dollars) * float(incentive['target_size'])
+                        tmp_dict = {
+                            'ticker': curr_ticker,
+                            'start_date': incentive['start_date'],
+                            'discount_factor_bps': incentive['discount_factor_bps'],
+                            'end_date': incentive['end_date'],
+                            'id': incentive['id'],
+                            'title': ticker_dict[curr_ticker]['title'],
+                            'rules_primary': ticker_dict[curr_ticker]['rules_primary'],
+                            'incentive_type': incentive['incentive_type'],
+                            'paid_out': incentive['paid_out'],
+                            'period_reward': incentive['period_reward'],
+                            'target_size': incentive['target_size'],
+                            'yes_ask_dollars': yes_ask_dollars,
+                            'no_ask_dollars': no_ask_dollars,
+                            'volume': volume,
+                            'spread': spread,
+                            # 'max_loss_dollars': max_loss_dollars
+                        }
+                        self.trade_incentive_dict[curr_ticker] = tmp_dict
         except Exception as e:
             print(f"Error get_incentive_tickers tickers on the [INCENTIVE_PROGRAM]: {e}")
         finally:
@@ -0,0 +1,173 @@
+import json
+import sqlite3
+import threading
+import time
+
+JOURNAL_FILE = "bot_journal.db"
+CLOSED_ORDER_STATUSES = ['canceled', 'filled', 'executed']
+
+
+class JOURNAL:
+    """Append-only SQLite (WAL) journal of order intents, acknowledgements, fills and bot state."""
+
+    def __init__(self, path: str, batch_size: int = 50, compact_size: int = 5000, history_size: int = 1000):
+        self.path = path
+        self.batch_size = batch_size
+        self.compact_size = compact_size
+        self.history_size = history_size
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._since_snapshot = 0
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        # FULL fsyncs every commit; commits are batched so this costs one fsync per batch
+        self.conn.execute("PRAGMA synchronous=FULL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS events ("
+            "seq INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "ts REAL NOT NULL, "
+            "kind TEXT NOT NULL, "
+            "ref TEXT, "
+            "payload TEXT)"
+        )
+        self.conn.execute("BEGIN")
+
+    def append(self, kind: str, ref: str = None, payload=None):
+        with self._lock:
+            self.conn.execute(
+                "INSERT INTO events (ts, kind, ref, payload) VALUES (?, ?, ?, ?)",
+                (time.time(), kind, ref, json.dumps(payload) if payload is not None else None),
+            )
+            self._pending += 1
+            self._since_snapshot += 1
+            if self._pending >= self.batch_size:
+                self._commit()
+
+    def _commit(self):
+        self.conn.execute("COMMIT")
+        self.conn.execute("BEGIN")
+        self._pending = 0
+
+    def flush(self):
+        """Commits (and fsyncs) all buffered records."""
+        with self._lock:
+            if self._pending:
+                self._commit()
+
+    def record_intent(self, key: str, order: dict):
+        self.append('intent', key, order)
+
+    def record_ack(self, order: dict):
+        self.append('ack', order.get('order_id'), order)
+
+    def record_abandon(self, key: str):
+        """Resolves an intent whose submission failed without an order."""
+        self.append('abandon', key)
+
+    def record_cancel(self, order_id: str):
+        self.append('cancel', order_id)
+
+    def record_fill(self, fill: dict):
+        self.append('fill', fill.get('order_id'), fill)
+
+    def record_reconcile(self, resting_order_ids: list):
+        """Records the resting orders of a REST reconciliation; older intents are resolved by it."""
+        self.append('reconcile', None, resting_order_ids)
+
+    def record_trade_orders(self, trade_orders: dict):
+        self.append('trade_orders', None, trade_orders)
+
+    def record_close(self, trade: dict):
+        self.append('close', trade.get('ticker'), trade)
+
+    @staticmethod
+    def _order_count(order: dict) -> int:
+        count = order.get('initial_count', order.get('count'))
+        if count is not None:
+            return int(count)
+        return (order.get('fill_count') or 0) + (order.get('remaining_count') or 0)
+
+    def replay(self):
+        """Rebuilds bot state from the latest snapshot and the events after it."""
+        with self._lock:
+            return self._replay()
+
+    def _replay(self):
+        state = {'orders': {}, 'intents': {}, 'fills': [], 'trade_orders': {}, 'history': []}
+        row = self.conn.execute("SELECT MAX(seq) FROM events WHERE kind = 'snapshot'").fetchone()
+        start_seq = row[0] or 0
+        rows = self.conn.execute(
+            "SELECT kind, ref, payload FROM events WHERE seq >= ? ORDER BY seq", (start_seq,)
+        ).fetchall()
+
+        for kind, ref, payload in rows:
+            data = json.loads(payload) if payload is not None else None
+            if kind == 'snapshot':
+                state = data
+            elif kind == 'intent':
+                state['intents'][ref] = data
+            elif kind == 'ack':
+                if data.get('client_order_id') in state['intents']:
+                    state['intents'].pop(data['client_order_id'])
+                else:
+                    ticker = data.get('ticker')
+                    for key in [key for key, intent in state['intents'].items() if intent.get('ticker') == ticker]:
+                        state['intents'].pop(key)
+                if data.get('status') in CLOSED_ORDER_STATUSES:
+                    state['orders'].pop(ref, None)
+                else:
+                    data['initial_count'] = self._order_count(data)
+                    state['orders'][ref] = data
+            elif kind == 'abandon':
+                state['intents'].pop(ref, None)
+            elif kind == 'cancel':
+                state['orders'].pop(ref, None)
+            elif kind == 'fill':
+                state['fills'].append(data)
+                order = state['orders'].get(ref)
+                if order is not None:
+                    # fills of a resting order are counted so filled quotes are dropped
+                    order['fill_count'] = (order.get('fill_count') or 0) + (data.get('count') or 0)
+                    if order['fill_count'] >= order['initial_count']:
+                        state['orders'].pop(ref)
+            elif kind == 'reconcile':
+                # orders that expired or filled unseen are gone, and no intent is still in flight
+                resting_order_ids = set(data)
+                state['orders'] = {order_id: order for order_id, order in state['orders'].items() if order_id in resting_order_ids}
+                state['intents'] = {}
+            elif kind == 'trade_orders':
+                state['trade_orders'] = data
+            elif kind == 'close':
+                state['history'].append(data)
+                if len(state['history']) > self.history_size:
+                    state['history'] = state['history'][-self.history_size:]
+        # fills before the last position reconciliation are not needed to resume
+        state['fills'] = state['fills'][-self.history_size:]
+        return state
+
+    def needs_compact(self):
+        return self._since_snapshot >= self.compact_size
+
+    def compact(self):
+        """Writes a snapshot of the replayed state and drops the events before it.
+
+        The lock is held throughout, so no event can be appended between the
+        replay and the delete without being in the snapshot.
+        """
+        with self._lock:
+            state = self._replay()
+            self.conn.execute(
+                "INSERT INTO events (ts, kind, ref, payload) VALUES (?, 'snapshot', NULL, ?)",
+                (time.time(), json.dumps(state)),
+            )
+            seq = self.conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+            self.conn.execute("DELETE FROM events WHERE seq < ?", (seq,))
+            self._commit()
+            self._since_snapshot = 0
+        return state
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self.conn.execute("COMMIT")
+            self.conn.close()
@@ -1,54 +1,212 @@
-import os
-from dotenv import load_dotenv
-from cryptography.hazmat.primitives import serialization
-import asyncio
+import time
+
+STARTUP_TIME = time.perf_counter()
+
+import argparse
 import json
+import os
+import sys
+
+# Heavy modules (requests, cryptography, websockets, dotenv) are imported
+# inside the subcommands that need them so short-lived tools start quickly.
+
+_private_key = None
+
+
+def get_environment(name: str):
+    from clients import Environment
+    return Environment.DEMO if name == 'demo' else Environment.PROD
+
+
+def load_private_key(keyfile: str):
+    """Loads the PEM private key once and shares it between clients."""
+    global _private_key
+    if _private_key is None:
+        from cryptography.hazmat.primitives import serialization
+        try:
+            with open(keyfile, "rb") as key_file:
+                _private_key = serialization.load_pem_private_key(
+                    key_file.read(),
+                    password=None  # Provide the password if your key is encrypted
+                )
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Private key file not found at {keyfile}")
+        except Exception as e:
+            raise Exception(f"Error loading private key: {str(e)}")
+    return _private_key
+
+
+def load_credentials(env_name: str):
+    from dotenv import load_dotenv
+    load_dotenv()
+    prefix = 'DEMO' if env_name == 'demo' else 'PROD'
+    key_id = os.getenv(f'{prefix}_KEYID')
+    private_key = load_private_key(os.getenv(f'{prefix}_KEYFILE'))
+    return key_id, private_key
 
-from clients import KalshiHttpClient, KalshiWebSocketClient, Environment
 
-# Load environment variables
-load_dotenv()
-env = Environment.PROD # toggle environment here
-KEYID = os.getenv('DEMO_KEYID') if env == Environment.DEMO else os.getenv('PROD_KEYID')
-KEYFILE = os.getenv('DEMO_KEYFILE') if env == Environment.DEMO else os.getenv('PROD_KEYFILE')
+def create_http_client(args):
+    from clients import KalshiHttpClient
+    key_id, private_key = load_credentials(args.env)
+    return KalshiHttpClient(
+        key_id=key_id,
+        private_key=private_key,
+        environment=get_environment(args.env)
+    )
 
-try:
-    with open(KEYFILE, "rb") as key_file:
-        private_key = serialization.load_pem_private_key(
-            key_file.read(),
-            password=None  # Provide the password if your key is encrypted
+
+def create_bot(args, with_stream: bool = False):
+    from clients import KalshiWebSocketClient
+    from incentive import INCENTIVE_PROGRAM
+    from trade import TRADE
+    from portfolio import PORTFOLIO
+    from journal import JOURNAL, JOURNAL_FILE
+    from market_bot import MARKET_BOT, HISTORICAL_TRADE_MAX
+
+    client = create_http_client(args)
+    ws_client = None
+    if with_stream:
+        key_id, private_key = load_credentials(args.env)
+        ws_client = KalshiWebSocketClient(
+            key_id=key_id,
+            private_key=private_key,
+            environment=get_environment(args.env)
         )
-except FileNotFoundError:
-    raise FileNotFoundError(f"Private key file not found at {KEYFILE}")
-except Exception as e:
-    raise Exception(f"Error loading private key: {str(e)}")
-
-# Initialize the HTTP client
-client = KalshiHttpClient(
-    key_id=KEYID,
-    private_key=private_key,
-    environment=env
-)
-
-# Get account balance
-balance = client.get_balance()
-print(f"Balance: {json.dumps(balance, indent=4)} \n")
-
-# positions = client.get_positions()
-# print(f"Positions: {json.dumps(positions, indent=4)} \n")
-
-# incentive = client.get_market_incentive()
-# print(f"Incentive: {json.dumps(incentive, indent=4)} \n")
-
-# tickers = client.get_ticker('KXLOWTDEN-26JAN11-T26')
-# print(f"Tickers: {json.dumps(tickers, indent=4)} \n")
-
-# Initialize the WebSocket client
-# ws_client = KalshiWebSocketClient(
-#     key_id=KEYID,
-#     private_key=private_key,
-#     environment=env
-# )
-
-# # Connect via WebSocket
-# asyncio.run(ws_client.connect())
\ No newline at end of file
+    journal = JOURNAL(args.journal or JOURNAL_FILE, history_size=HISTORICAL_TRADE_MAX)
+    return MARKET_BOT(INCENTIVE_PROGRAM(), TRADE(), client, PORTFOLIO(), journal, ws_client)
+
+
+def report_startup(command: str):
+    elapsed_ms = (time.perf_counter() - STARTUP_TIME) * 1000
+    print(f"[STARTUP] {command} ready in {elapsed_ms:.1f} ms", file=sys.stderr)
+
+
+def cmd_run(args):
+    market_bot = create_bot(args, with_stream=True)
+    report_startup(args.command)
+    market_bot.run()
+
+
+def cmd_balance(args):
+    client = create_http_client(args)
+    report_startup(args.command)
+    balance = client.get_balance()
+    print(f"Balance: {json.dumps(balance, indent=4)} \n")
+
+
+def cmd_positions(args):
+    client = create_http_client(args)
+    report_startup(args.command)
+    positions = client.get_positions()
+    print(f"Positions: {json.dumps(positions, indent=4)} \n")
+
+
+def cmd_flatten(args):
+    market_bot = create_bot(args)
+    report_startup(args.command)
+    residual_positions = market_bot.flatten()
+    return 1 if residual_positions else 0
+
+
+def cmd_record(args):
+    """Appends incentive programs and the order books of their markets to a JSON lines file."""
+    client = create_http_client(args)
+    report_startup(args.command)
+    for i in range(args.count):
+        incentives = client.get_market_incentive()['incentive_programs']
+        tickers = sorted({incentive['market_ticker'] for incentive in incentives if incentive['paid_out'] == False})
+        order_books = {}
+        for ticker in tickers:
+            order_books[ticker] = client.get_market_ticker_order_book(ticker)['orderbook']
+        with open(args.output, 'a') as f:
+            f.write(json.dumps({'ts': time.time(), 'incentive_programs': incentives, 'orderbooks': order_books}) + '\n')
+        print(f"Recorded {len(tickers)} order books to {args.output}")
+        if i < args.count - 1:
+            time.sleep(args.interval)
+
+
+def cmd_pnl(args):
+    """Catches up on fills since the last analytics checkpoint and prints the PnL."""
+    from analytics import PNL_ANALYTICS
+    from market_bot import ANALYTICS_DIR
+    client = create_http_client(args)
+    analytics = PNL_ANALYTICS(args.directory or ANALYTICS_DIR)
+    report_startup(args.command)
+    fill_count = 0
+    for fill in client.iter_fills(min_ts=int(analytics.last_fill_ts)):
+        analytics.on_fill(fill)
+        fill_count += 1
+    analytics.flush()
+    print(f"New fills: {fill_count}")
+    print(f"PnL: {json.dumps(analytics.summary(), indent=4)}")
+
+
+def cmd_marketdata(args):
+    from market_data import MARKET_DATA_DAEMON, MARKET_DATA_WRITER, MARKET_DATA_FILE
+    client = create_http_client(args)
+    writer = MARKET_DATA_WRITER(args.path or MARKET_DATA_FILE)
+    report_startup(args.command)
+    MARKET_DATA_DAEMON(client, writer, interval=args.interval).run()
+
+
+def cmd_profile(args):
+    """Asks a running bot to start (or stop) profiling its trading cycles."""
+    import signal
+    os.kill(args.pid, signal.SIGUSR2 if args.stop else signal.SIGUSR1)
+    print(f"Sent profiling {'stop' if args.stop else 'start'} request to {args.pid}")
+
+
+def cmd_replay(args):
+    from journal import JOURNAL, JOURNAL_FILE
+    journal = JOURNAL(args.journal or JOURNAL_FILE)
+    report_startup(args.command)
+    state = journal.replay()
+    print(f"Resting orders: {json.dumps(state['orders'], indent=4)}")
+    print(f"Unacknowledged intents: {json.dumps(state['intents'], indent=4)}")
+    print(f"Trade orders: {', '.join(state['trade_orders']) or 'none'}")
+    print(f"Fills: {len(state['fills'])} | Closed trades: {len(state['history'])}")
+    journal.close()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Kalshi market making bot")
+    parser.add_argument('--env', choices=['prod', 'demo'], default='prod', help="API environment")
+    parser.add_argument('--journal', default=None, help="journal file (default: bot_journal.db)")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    subparsers.add_parser('run', help="run the market making bot").set_defaults(func=cmd_run)
+    subparsers.add_parser('balance', help="print the account balance").set_defaults(func=cmd_balance)
+    subparsers.add_parser('positions', help="print the account positions").set_defaults(func=cmd_positions)
+    subparsers.add_parser('flatten', help="cancel all orders and close all positions").set_defaults(func=cmd_flatten)
+
+    record = subparsers.add_parser('record', help="record incentives and order books")
+    record.add_argument('--output', default="market_data.jsonl")
+    record.add_argument('--count', type=int, default=1)
+    record.add_argument('--interval', type=float, default=60)
+    record.set_defaults(func=cmd_record)
+
+    subparsers.add_parser('replay', help="print the state rebuilt from the journal").set_defaults(func=cmd_replay)
+
+    pnl = subparsers.add_parser('pnl', help="update and print PnL analytics from new fills")
+    pnl.add_argument('--directory', default=None)
+    pnl.set_defaults(func=cmd_pnl)
+
+    marketdata = subparsers.add_parser('marketdata', help="publish market data to shared memory for local bots")
+    marketdata.add_argument('--path', default=None)
+    marketdata.add_argument('--interval', type=float, default=10)
+    marketdata.set_defaults(func=cmd_marketdata)
+
+    profile = subparsers.add_parser('profile', help="start or stop profiling a running bot")
+    profile.add_argument('pid', type=int)
+    profile.add_argument('--stop', action='store_true')
+    profile.set_defaults(func=cmd_profile)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,37 +1,93 @@
-import os
 import asyncio
 import json
+import os
 import time
+import threading
 import traceback
+import uuid
+from collections import deque
 from incentive import INCENTIVE_PROGRAM
 from trade import TRADE
-from clients import KalshiHttpClient, Environment
-from dotenv import load_dotenv
-from cryptography.hazmat.primitives import serialization
+from portfolio import PORTFOLIO
+from quotes import QUOTE_MANAGER
+from journal import JOURNAL
+from scoring import REWARD_SCORER
+from risk import RISK_ENGINE
+from analytics import PNL_ANALYTICS
+from profiling import PROFILER
+from market_data import MARKET_DATA_CACHE, MARKET_DATA_SOURCE, MARKET_DATA_FILE
+from clients import KalshiHttpClient, KalshiWebSocketClient
 from datetime import datetime, timedelta
 
 TRADE_SIZE = 1
 WAIT_TIME = 600
-EXPIRATION_TS = 600
+# exchange-side backstop only; QUOTE_MANAGER refreshes quotes long before this
+EXPIRATION_TS = 3600
+QUOTE_TTL = 120
+QUOTE_BOOK_CHECK_TIME = 30
 
 TRADE_PRICE_RANGE = [0.05, 0.3]
 STOP_TRADE_TIME = 300
 
 CHECK_TIME = 3600
+RECONCILE_TIME = 1800
+STREAM_RECONNECT_TIME = 5
 OPEN_POSITIONS_MAX = 2
 
+UNWIND_MAX_LEVELS = 5
+UNWIND_MAX_SLIPPAGE = 0.1
+
 MINIMUM_MARKET_PRICE_DELTA = 0.2
 
 LOG_FILE = "trade.log"
+HISTORICAL_TRADE_MAX = 1000
+MARKET_DATA_MAX_AGE = 30
+ANALYTICS_DIR = "analytics"
+ANALYTICS_FLUSH_TIME = 300
+PROFILE_DIR = "profiles"
+PROFILE_CYCLES = 3
+PROFILE_SAMPLE_INTERVAL = 0.01
+
+# pre-trade risk limits (exposure in contracts)
+MAX_TICKER_EXPOSURE = 10
+MAX_EVENT_EXPOSURE = 20
+MAX_TOTAL_EXPOSURE = 50
+MAX_ORDER_RATE = 5
+PRICE_BAND = 0.5
 
 
 class MARKET_BOT:
 
-    def __init__(self, incentive_program: INCENTIVE_PROGRAM, trade: TRADE, client: KalshiHttpClient):
+    def __init__(self, incentive_program: INCENTIVE_PROGRAM, trade: TRADE, client: KalshiHttpClient,
+                 portfolio: PORTFOLIO, journal: JOURNAL, ws_client: KalshiWebSocketClient = None):
         self.incentive_program = incentive_program
         self.incentive_program.stop_trade_time = STOP_TRADE_TIME
         self.trade = trade
         self.client = client
+        # shared snapshot from the market-data daemon, falling back to the API when it is down
+        self.market_data = MARKET_DATA_SOURCE(client, MARKET_DATA_CACHE(MARKET_DATA_FILE, max_age=MARKET_DATA_MAX_AGE))
+        self.portfolio = portfolio
+        self.portfolio.reconcile_interval = RECONCILE_TIME
+        self.trade.portfolio = portfolio
+        self.trade.scorer = REWARD_SCORER()
+        self.risk = RISK_ENGINE(
+            portfolio,
+            max_ticker_exposure=MAX_TICKER_EXPOSURE,
+            max_event_exposure=MAX_EVENT_EXPOSURE,
+            max_total_exposure=MAX_TOTAL_EXPOSURE,
+            max_order_rate=MAX_ORDER_RATE,
+            price_band=PRICE_BAND,
+        )
+        self.quotes = QUOTE_MANAGER()
+        self.journal = journal
+        self.analytics = PNL_ANALYTICS(ANALYTICS_DIR, flush_interval=ANALYTICS_FLUSH_TIME)
+        self.last_accrual = time.monotonic()
+        self.fills_stale = False
+        self.profiler = PROFILER(PROFILE_DIR, cycles=PROFILE_CYCLES, interval=PROFILE_SAMPLE_INTERVAL)
+        self.ws_client = ws_client
+        if self.ws_client is not None:
+            self.ws_client.channels = ["fill", "user_orders"]
+            self.ws_client.message_handler = self.on_ws_message
         self.trade.trade_size = TRADE_SIZE
         self.trade.expiration_ts = EXPIRATION_TS
         self.wait_time = WAIT_TIME
@@ -39,131 +95,373 @@ class MARKET_BOT:
         self.trade.trade_price_range = TRADE_PRICE_RANGE
         self.trade.open_position_max = OPEN_POSITIONS_MAX
         self.trade.minimum_market_price_delta = MINIMUM_MARKET_PRICE_DELTA
+        self.trade.unwind_max_levels = UNWIND_MAX_LEVELS
+        self.trade.unwind_max_slippage = UNWIND_MAX_SLIPPAGE
 
-        self.historical_trade_list = []
+        self.historical_trade_list = deque(maxlen=HISTORICAL_TRADE_MAX)
+        # resting orders recovered from the journal, adopted as quotes on the first cycle after a restart
+        self.resume_order_ids = set()
 
     def get_datetime(self):
         return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     
     def log(self, message: str):
         """Print message to console and write to log file."""
-        print(message)
+        with self.profiler.phase('log'):
+            print(message)
+            try:
+                with open(self.log_file, 'a') as f:
+                    f.write(message + '\n')
+            except Exception as e:
+                print(f"Error writing to log file: {e}")
+
+    def reconcile_portfolio(self):
+        """Rebuilds the local portfolio state from REST."""
+        positions = self.client.get_positions()['market_positions']
+        orders = self.client.get_open_orders()['orders']
+        balance = self.client.get_balance()['balance']
+        self.portfolio.reconcile(positions, orders, balance)
+        self.journal.record_reconcile([order['order_id'] for order in self.portfolio.get_resting_orders()])
+        # fills the stream may have missed are caught up after trading
+        self.fills_stale = True
+        self.log(f"{self.get_datetime()} [RECONCILE] Positions: {len(self.portfolio.get_positions())} | Resting Orders: {len(self.portfolio.get_resting_orders())} | Balance: {balance}")
+
+    def sync_clock(self):
+        """Estimates the exchange clock offset from the exchange status response before trading."""
+        try:
+            self.client.get_exchange_status()
+        except Exception as e:
+            self.log(f"{self.get_datetime()} [ERROR] Failed to sync exchange clock: {str(e)}")
+            return
+        self.log(f"{self.get_datetime()} [CLOCK] Exchange clock offset: {self.client.clock.get_offset() * 1000:+.0f}ms")
+
+    def sync_fills(self):
+        """Feeds fills since the last analytics checkpoint into the PnL analytics."""
+        fill_count = 0
+        for fill in self.client.iter_fills(min_ts=int(self.analytics.last_fill_ts)):
+            self.analytics.on_fill(fill)
+            fill_count += 1
+        return fill_count
+
+    def catch_up_fills(self):
+        """Best-effort fill catch-up after a reconciliation; never blocks trading."""
+        if not self.fills_stale:
+            return
         try:
-            with open(self.log_file, 'a') as f:
-                f.write(message + '\n')
+            fill_count = self.sync_fills()
         except Exception as e:
-            print(f"Error writing to log file: {e}")
+            self.log(f"{self.get_datetime()} [ERROR] Failed to catch up fills: {str(e)}")
+            return
+        self.fills_stale = False
+        if fill_count:
+            self.log(f"{self.get_datetime()} [FILLS] Caught up {fill_count} fills")
+
+    def accrue_incentives(self):
+        """Accrues the estimated incentive reward earned by resting quotes since the last call."""
+        now = time.monotonic()
+        elapsed = now - self.last_accrual
+        self.last_accrual = now
+        quoted_tickers = {order.get('ticker') for order in self.portfolio.get_resting_orders()}
+        for ticker in quoted_tickers:
+            duration = self.incentive_program.get_program_duration(ticker)
+            if not duration:
+                continue
+            self.analytics.accrue_incentive(ticker, self.trade.scorer.expected_reward(ticker) * elapsed / duration)
+
+    def log_latency(self):
+        """Logs the exchange clock offset and the smoothed round-trip time of each endpoint."""
+        latencies = self.client.get_latencies()
+        latency_info = ' | '.join(f"{key}: {latency:.1f}ms" for key, latency in sorted(latencies.items()))
+        self.log(f"{self.get_datetime()} [LATENCY] Clock offset: {self.client.clock.get_offset() * 1000:+.0f}ms | {latency_info or 'no requests'}")
+
+    def log_pnl(self):
+        summary = self.analytics.summary()
+        self.log(f"{self.get_datetime()} [PNL] Realized: ${summary['realized_pnl']:.4f} | Unrealized: ${summary['unrealized_pnl']:.4f} | Fees: ${summary['fees']:.4f} | Incentive Accrued: {summary['incentive_accrued']:.4f}")
+
+    def on_ws_message(self, message: str):
+        """Journals fills from the WebSocket stream before applying them to the portfolio."""
+        data = json.loads(message)
+        if data.get('type') == 'fill':
+            self.journal.record_fill(data.get('msg') or {})
+            self.analytics.on_fill(data.get('msg') or {})
+        self.portfolio.on_ws_message(message)
+
+    def resume_from_journal(self):
+        """Restores the selected orders and trade history recorded before a restart."""
+        state = self.journal.replay()
+        self.trade.open_trade_orders = state['trade_orders']
+        self.historical_trade_list.extend(state['history'])
+        self.resume_order_ids = set(state['orders'])
+        self.journal.compact()
+        if self.trade.has_open_position():
+            self.log(f"{self.get_datetime()} [RESUME] Tickers: {', '.join(self.trade.get_open_trade_orders())} | Resting Orders: {len(self.resume_order_ids)}")
+
+    def start_portfolio_stream(self):
+        """Keeps the portfolio updated from the WebSocket fill and user_orders channels."""
+        if self.ws_client is None:
+            return
+
+        def stream():
+            while True:
+                try:
+                    asyncio.run(self.ws_client.connect())
+                except Exception as e:
+                    self.log(f"{self.get_datetime()} [ERROR] Portfolio stream failed: {str(e)}")
+                # Fills may have been missed while disconnected
+                self.portfolio.invalidate()
+                time.sleep(STREAM_RECONNECT_TIME)
+
+        threading.Thread(target=stream, daemon=True).start()
+
+    def fetch_order_books(self, tickers: list, live: bool = False, depth: int = None):
+        """Fetches the order books of the given tickers concurrently.
+
+        Books come from the shared market-data snapshot unless live is set,
+        limited to the best `depth` levels per side if given.
+        """
+        tickers = list(tickers)
+        order_books = {}
+        source = self.client if live else self.market_data
+        with self.profiler.phase('book fetch'):
+            results = self.client.map(lambda ticker: source.get_market_ticker_order_book(ticker, depth), tickers)
+        for ticker, result in zip(tickers, results):
+            if isinstance(result, Exception):
+                self.log(f"{self.get_datetime()} [ERROR] Failed to get order book for {ticker}: {str(result)}")
+                continue
+            order_books[ticker] = result['orderbook']
+        self.analytics.update_marks(order_books)
+        return order_books
+
+    def cancel_orders(self, orders: list):
+        """Cancels the given resting orders concurrently; returns the cancelled order ids."""
+        for order in orders:
+            side = order.get('side', 'N/A')
+            yes_price = order.get('yes_price_dollars', order.get('yes_price', 'N/A'))
+            no_price = order.get('no_price_dollars', order.get('no_price', 'N/A'))
+            price = yes_price if side == 'yes' else no_price
+            self.log(f"{self.get_datetime()} [CANCEL ORDER] Ticker: {order.get('ticker', 'N/A')} | Side: {side} | Price: {price}")
+
+        order_ids = [order['order_id'] for order in orders]
+        results = self.client.map(self.client.cancel_open_order, order_ids)
+        cancelled = set()
+        for order_id, result in zip(order_ids, results):
+            # 404: the order already filled, expired or was cancelled elsewhere
+            if isinstance(result, Exception) and getattr(result, 'status_code', None) != 404:
+                self.log(f"{self.get_datetime()} [ERROR] Failed to cancel order: {str(result)}")
+                continue
+            self.portfolio.apply_cancel(order_id)
+            self.quotes.remove(order_id)
+            self.journal.record_cancel(order_id)
+            cancelled.add(order_id)
+        return cancelled
+
+    def close_positions(self):
+        """Unwinds all open positions with depth-sized IOC orders in one batched submission."""
+        curr_open_positions = self.portfolio.get_positions()
+        if not curr_open_positions:
+            return
+
+        # the unwind never walks deeper than unwind_max_levels
+        order_books = self.fetch_order_books(curr_open_positions, live=True, depth=self.trade.unwind_max_levels)
+        close_orders, skipped = self.trade.create_close_orders(curr_open_positions, order_books)
+        for ticker in skipped:
+            self.log(f"{self.get_datetime()} [SKIP POSITION] Ticker: {ticker} | Position: {curr_open_positions[ticker]} | Reason: No bid price available")
+        if not close_orders:
+            return
+
+        for order in close_orders:
+            side = order['side']
+            price = order[f"{side}_price_dollars"]
+            closed_trade = {
+                'ticker': order['ticker'],
+                'side': side,
+                'price': price,
+                'count': order['count'],
+                'datetime': self.get_datetime(),
+            }
+            self.historical_trade_list.append(closed_trade)
+            self.journal.record_close(closed_trade)
+            self.log(f"{self.get_datetime()} [CLOSE POSITION] Ticker: {order['ticker']} | Side: {side} | Price: {price} | Count: {order['count']}")
+
+        try:
+            response = self.client.batch_create_orders(close_orders)
+        except Exception as e:
+            self.log(f"{self.get_datetime()} [ERROR] Failed to close positions: {str(e)}")
+            self.log(f"{self.get_datetime()} [ERROR] Traceback: {traceback.format_exc()}")
+            return
+
+        for result in response['orders']:
+            if result.get('order'):
+                self.portfolio.apply_order_response(result['order'])
+                self.journal.record_ack(result['order'])
+            if result.get('error'):
+                self.log(f"{self.get_datetime()} [ERROR] Failed to close position: {result['error']}")
+
+    def handle_incentive_events(self):
+        """Stops quoting tickers whose incentive program has just reached its cutoff."""
+        expired_tickers = self.incentive_program.process_events()
+        if not expired_tickers:
+            return
+        self.trade.expire_tickers(expired_tickers)
+        self.log(f"{self.get_datetime()} [INCENTIVE EXPIRED] Tickers: {', '.join(expired_tickers)}")
+        self.cancel_orders([
+            order for order in self.portfolio.get_resting_orders()
+            if order.get('ticker') in expired_tickers
+        ])
+        self.journal.record_trade_orders(self.trade.get_open_trade_orders())
+        self.journal.flush()
+
+    def requote(self, tickers: list, replace: bool = True):
+        """Keeps quotes still at the selected side and price; replaces or cancels the rest.
+
+        An unchanged quote only has its refresh deadline pushed back, so it
+        costs no write call and keeps its place in the queue. With replace=False
+        moved quotes are only cancelled.
+        """
+        selected = self.trade.get_open_trade_orders()
+        stale_orders = []
+        changed = []
+        for ticker in tickers:
+            quote = self.quotes.get_ticker_quote(ticker)
+            order = selected.get(ticker)
+            if order is None:
+                if quote is not None:
+                    stale_orders.append(quote['order'])
+                continue
+            if quote is not None and quote['side'] == order['side'] and round(quote['price'], 4) == round(order['price'], 4):
+                self.quotes.reschedule(quote['order_id'], QUOTE_TTL)
+                self.log(f"{self.get_datetime()} [QUOTE KEEP] Ticker: {ticker} | Side: {quote['side']} | Price: {quote['price']:.4f}")
+                continue
+            if quote is not None:
+                stale_orders.append(quote['order'])
+            changed.append(ticker)
+
+        if stale_orders:
+            self.cancel_orders(stale_orders)
+        # never stack a replacement on top of a quote that failed to cancel
+        changed = [ticker for ticker in changed if self.quotes.get_ticker_quote(ticker) is None]
+        if changed and replace:
+            self.submit_orders(self.trade.create_open_order(changed))
+
+    def refresh_quotes(self, tickers: list):
+        """Re-prices the quotes on the given tickers against fresh books and requotes the ones that moved."""
+        self.quotes.prune({order['order_id'] for order in self.portfolio.get_resting_orders()})
+        tickers = [ticker for ticker in tickers if self.quotes.get_ticker_quote(ticker) is not None]
+        if not tickers:
+            return
+        incentive_dict = self.incentive_program.get_trade_incentive_dict()
+        order_books = self.fetch_order_books([ticker for ticker in tickers if ticker in incentive_dict])
+        with self.profiler.phase('quote'):
+            dropped = self.trade.reprice_open_orders(incentive_dict, order_books)
+        if dropped:
+            self.log(f"{self.get_datetime()} [QUOTE DROP] Tickers: {', '.join(dropped)}")
+            self.journal.record_trade_orders(self.trade.get_open_trade_orders())
+        # no new opening orders while positions are open, as in start_trading
+        self.requote(tickers, replace=not self.portfolio.get_positions())
+
+    def handle_quote_deadlines(self):
+        """Refreshes the quotes whose own deadline has passed."""
+        due = self.quotes.advance()
+        if not due:
+            return
+        try:
+            self.refresh_quotes([quote['ticker'] for quote in due])
+        finally:
+            for quote in due:
+                # quotes that could not be refreshed are retried after another TTL
+                if self.quotes.is_managed(quote['order_id']) and not quote['scheduled']:
+                    self.quotes.reschedule(quote['order_id'], QUOTE_TTL)
+
+    def wait_for_next_cycle(self):
+        """Sleeps until the next cycle, waking early for incentive events, quote deadlines and book checks."""
+        # local deadlines are monotonic; incentive events are on the exchange clock
+        next_cycle = time.monotonic() + self.wait_time
+        next_book_check = time.monotonic() + QUOTE_BOOK_CHECK_TIME
+        while True:
+            now = time.monotonic()
+            if now >= next_cycle:
+                return
+            wake_times = [next_cycle, self.quotes.next_deadline()]
+            next_event = self.incentive_program.next_event_time()
+            if next_event is not None:
+                wake_times.append(now + next_event - self.client.clock.now())
+            if self.quotes.get_quotes():
+                wake_times.append(next_book_check)
+            wake_time = min(wake_time for wake_time in wake_times if wake_time is not None)
+            self.profiler.sleep(max(0, wake_time - now))
+            # act on SIGUSR1/SIGUSR2 now rather than at the next cycle
+            self.begin_profile_cycle()
+            if self.profiler.requested is False:
+                self.end_profile_cycle()
+            try:
+                self.handle_incentive_events()
+                self.handle_quote_deadlines()
+                if time.monotonic() >= next_book_check:
+                    next_book_check = time.monotonic() + QUOTE_BOOK_CHECK_TIME
+                    self.refresh_quotes([quote['ticker'] for quote in self.quotes.get_quotes()])
+            except Exception as e:
+                self.log(f"{self.get_datetime()} [ERROR] Failed to handle scheduled events: {str(e)}")
+                self.log(f"{self.get_datetime()} [ERROR] Traceback: {traceback.format_exc()}")
+
+    def flatten(self):
+        """Cancels every resting order and unwinds every position (emergency flatten)."""
+        self.reconcile_portfolio()
+        self.cancel_orders(self.portfolio.get_resting_orders())
+        self.close_positions()
+        self.journal.flush()
+        residual_positions = self.portfolio.get_positions()
+        if residual_positions:
+            self.log(f"{self.get_datetime()} [FLATTEN] Residual positions: {residual_positions}")
+        return residual_positions
 
     def start_trading(self):
         try:
-            curr_open_orders = self.client.get_open_orders()['orders']
-            if curr_open_orders:
-                for order in curr_open_orders:
-                    try:
-                        if order['status'] not in ['canceled', 'filled', 'executed']:
-                            ticker = order.get('ticker', 'N/A')
-                            side = order.get('side', 'N/A')
-                            yes_price = order.get('yes_price_dollars', order.get('yes_price', 'N/A'))
-                            no_price = order.get('no_price_dollars', order.get('no_price', 'N/A'))
-                            price = yes_price if side == 'yes' else no_price
-                            self.log(f"{self.get_datetime()} [CANCEL ORDER] Ticker: {ticker} | Side: {side} | Price: {price}")
-                            self.client.cancel_open_order(order['order_id'])
-                    except Exception as e:
-                        self.log(f"{self.get_datetime()} [ERROR] Failed to cancel order: {str(e)}")
-                        self.log(f"{self.get_datetime()} [ERROR] Traceback: {traceback.format_exc()}")
-        
-            curr_open_positions = self.client.get_positions()['market_positions']
-            if curr_open_positions:
-                for position in curr_open_positions:
-                    try:
-                        position_count = position.get('position', 0)
-                        # Skip positions where position count is 0
-                        if position_count == 0:
-                            continue
-                        
-                        # Determine side: positive position = long yes, negative = long no
-                        side = 'yes' if position_count > 0 else 'no'
-                        count = abs(position_count)
-                        
-                        # Get order book to find current market price
-                        order_book = self.client.get_market_ticker_order_book(position['ticker'])['orderbook']
-                
-                        # For market orders, use best bid price (highest price someone will pay)
-                        # yes_dollars are bid prices for yes, no_dollars are bid prices for no
-                        if side == 'yes':
-                            # Get best bid price for yes (highest price)
-                            yes_dollars = order_book.get('yes_dollars', [])
-                            if yes_dollars:
-                                best_bid = max(yes_dollars, key=lambda x: float(x[0]))
-                                yes_price_dollars = f"{float(best_bid[0]):.4f}"
-                            else:
-                                yes_price_dollars = None
-                            no_price_dollars = None
-                        else:
-                            # Get best bid price for no (highest price)
-                            no_dollars = order_book.get('no_dollars', [])
-                            if no_dollars:
-                                best_bid = max(no_dollars, key=lambda x: float(x[0]))
-                                no_price_dollars = f"{float(best_bid[0]):.4f}"
-                            else:
-                                no_price_dollars = None
-                            yes_price_dollars = None
-                        
-                        if (side == 'yes' and yes_price_dollars is None) or (side == 'no' and no_price_dollars is None):
-                            ticker = position.get('ticker', 'N/A')
-                            position_count = position.get('position', 0)
-                            self.log(f"{self.get_datetime()} [SKIP POSITION] Ticker: {ticker} | Position: {position_count} | Reason: No bid price available")
-                            continue
-                        
-                        self.historical_trade_list.append({
-                            'ticker': position.get('ticker', 'N/A'),
-                            'side': side,
-                            'price': yes_price_dollars if side == 'yes' else no_price_dollars,
-                            'count': count,
-                            'datetime': self.get_datetime(),
-                        })
-                        
-                        ticker = position.get('ticker', 'N/A')
-                        price = yes_price_dollars if side == 'yes' else no_price_dollars
-                        self.log(f"{self.get_datetime()} [CLOSE POSITION] Ticker: {ticker} | Side: {side} | Price: {price} | Count: {count}")
-                        self.client.close_open_position_order(
-                            ticker=position['ticker'],
-                            side=side,
-                            action='sell',
-                            count=count,
-                            type="limit",
-                            yes_price_dollars=yes_price_dollars,
-                            no_price_dollars=no_price_dollars,
-                            time_in_force="immediate_or_cancel",
-                            reduce_only=True,
-                        )
-                    except Exception as e:
-                        ticker = position.get('ticker', 'N/A')
-                        self.log(f"{self.get_datetime()} [ERROR] Failed to close position {ticker}: {str(e)}")
-                        self.log(f"{self.get_datetime()} [ERROR] Traceback: {traceback.format_exc()}")
-
-            curr_open_positions = self.client.get_positions()['market_positions']
-            
-            # Check if there are any actual positions (non-zero position counts)
-            actual_positions = [p for p in curr_open_positions if p.get('position', 0) != 0] if curr_open_positions else []
+            if self.portfolio.needs_reconcile():
+                self.reconcile_portfolio()
+
+            resting_orders = self.portfolio.get_resting_orders()
+            self.quotes.prune({order['order_id'] for order in resting_orders})
+            # quotes are only kept while we hold no position; place_order re-prices them
+            keep_quotes = not self.portfolio.get_positions()
+            cancel_orders = []
+            for order in resting_orders:
+                if order['status'] in ['canceled', 'filled', 'executed']:
+                    continue
+                ticker = order.get('ticker', 'N/A')
+                if keep_quotes and ticker in self.trade.get_open_trade_orders():
+                    if self.quotes.is_managed(order['order_id']):
+                        continue
+                    if order['order_id'] in self.resume_order_ids and self.quotes.get_ticker_quote(ticker) is None:
+                        self.quotes.add(order, QUOTE_TTL)
+                        self.log(f"{self.get_datetime()} [RESUME ORDER] Ticker: {ticker} | OrderID: {order['order_id'][:8]}...")
+                        continue
+                cancel_orders.append(order)
+            if cancel_orders:
+                self.cancel_orders(cancel_orders)
+
+            self.close_positions()
+
+            # Residual positions come from the close order responses and the fill stream
+            actual_positions = self.portfolio.get_positions()
             if actual_positions:
                 position_info = []
-                for pos in actual_positions:
-                    ticker = pos.get('ticker', 'N/A')
-                    position_count = pos.get('position', 0)
+                for ticker, position_count in actual_positions.items():
                     side = 'yes' if position_count > 0 else 'no'
                     position_info.append(f"{ticker}({side}:{abs(position_count)})")
                 self.log(f"{self.get_datetime()} [SKIP TRADING] Open positions: {', '.join(position_info)}")
                 return
 
-            curr_market_incentive = self.client.get_market_incentive()
-            self.incentive_program.load_market_incentive(curr_market_incentive['incentive_programs'])
-            incentive_tickers = self.incentive_program.get_open_incentive_tickers()
-            ticker_dict = {}
-            for ticker in incentive_tickers:
-                curr_market_ticker = self.client.get_market_ticker(ticker)
-                ticker_dict[ticker] = curr_market_ticker['market']
-            self.incentive_program.fill_incentive_tickers(ticker_dict)
+            with self.profiler.phase('discover'):
+                curr_market_incentive = self.market_data.get_market_incentive()
+                self.incentive_program.load_market_incentive(curr_market_incentive['incentive_programs'])
+                incentive_tickers = self.incentive_program.get_open_incentive_tickers()
+                ticker_dict = {}
+                for ticker, curr_market_ticker in zip(incentive_tickers, self.client.map(self.market_data.get_market_ticker, incentive_tickers)):
+                    if isinstance(curr_market_ticker, Exception):
+                        self.log(f"{self.get_datetime()} [ERROR] Failed to get market {ticker}: {str(curr_market_ticker)}")
+                        continue
+                    ticker_dict[ticker] = curr_market_ticker['market']
+                self.incentive_program.fill_incentive_tickers(ticker_dict)
             curr_traded_incentive = self.incentive_program.get_trade_incentive_dict()
 
             if self.trade.has_open_position():
@@ -172,7 +470,7 @@ class MARKET_BOT:
                     self.trade.check_open_order_expiration(curr_traded_incentive)
                     if self.trade.has_open_position():
                         curr_traded_orders = self.trade.get_open_trade_orders()
-                        self.place_order(curr_traded_orders)
+                        self.place_order({ticker: curr_traded_incentive[ticker] for ticker in curr_traded_orders})
                 except Exception as e:
                     self.log(f"{self.get_datetime()} [ERROR] Failed to update incentive: {str(e)}")
                     self.log(f"{self.get_datetime()} [ERROR] Traceback: {traceback.format_exc()}")
@@ -190,91 +488,157 @@ class MARKET_BOT:
             self.log(f"{self.get_datetime()} [ERROR] Traceback: {traceback.format_exc()}")
     
     def place_order(self, curr_traded_incentive: dict):
-        trade_book_dict = {}
-        for trade_ticker in curr_traded_incentive:
-            trade_book_dict[trade_ticker] = self.client.get_market_ticker_order_book(trade_ticker)['orderbook']
+        trade_book_dict = self.fetch_order_books(curr_traded_incentive)
 
-        self.trade.prepare_open_order(curr_traded_incentive, trade_book_dict)
+        with self.profiler.phase('quote'):
+            self.trade.prepare_open_order(curr_traded_incentive, trade_book_dict)
+        self.journal.record_trade_orders(self.trade.get_open_trade_orders())
 
-        if self.trade.has_open_position():
-            self.trade.balance = self.client.get_balance()['balance']
-            market_orders = self.trade.create_open_order()
-            for order in market_orders:
-                try:
-                    ticker = order.get('ticker', 'N/A')
-                    side = order.get('side', 'N/A')
-                    action = order.get('action', 'N/A')
-                    count = order.get('count', 0)
-                    order_type = order.get('type', 'N/A')
-                    yes_price = order.get('yes_price_dollars', None)
-                    no_price = order.get('no_price_dollars', None)
-                    price = yes_price if side == 'yes' else no_price
-
-                    title = order.get('title', 'N/A')
-                    rules_primary = order.get('rules_primary', 'N/A')
-                    yes_qty = order.get('yes_qty', 0)
-                    no_qty = order.get('no_qty', 0)
-                    yes_price = order.get('yes_price', 0)
-                    no_price = order.get('no_price', 0)
-
-                    self.log(f"{self.get_datetime()} [OPEN ORDER] Ticker: {ticker} | Title: {title} | Rules Primary: {rules_primary}")
-                    self.log(f"  └─ Side: {side} | Action: {action} | Count: {count} | Type: {order_type} | Price: {price}")
-                    self.log(f"  └─ Market Yes Price: ${order['market_yes_price']:.4f} | Market No Price: ${order['market_no_price']:.4f}")
-                    self.log(f"  └─ Market Book: Yes Qty: {yes_qty} | No Qty: {no_qty} | Yes Price: ${yes_price:.4f} | No Price: ${no_price:.4f}")
-                    
-                    # Extract price values for API call
-                    yes_price_dollars = order.get('yes_price_dollars', None)
-                    no_price_dollars = order.get('no_price_dollars', None)
-                    
-                    # Log what we're sending to API for debugging
-                    # self.log(f"  └─ API Payload: yes_price_dollars={yes_price_dollars}, no_price_dollars={no_price_dollars}, expiration_ts={order.get('expiration_ts')}")
-                    
-                    response = self.client.create_open_order(
-                        ticker=order['ticker'],
-                        side=order['side'],
-                        action=order['action'],
-                        count=order['count'],
-                        type=order['type'],
-                        yes_price_dollars=yes_price_dollars,
-                        no_price_dollars=no_price_dollars,
-                        expiration_ts=order['expiration_ts'],
-                    )
-                    
-                    # Format response
-                    if response and 'order' in response:
-                        resp_order = response['order']
-                        order_id = resp_order.get('order_id', 'N/A')
-                        status = resp_order.get('status', 'N/A')
-                        fill_count = resp_order.get('fill_count', 0)
-                        remaining = resp_order.get('remaining_count', 0)
-                        self.log(f"{self.get_datetime()} [ORDER RESPONSE] OrderID: {order_id[:8]}... | Status: {status} | Filled: {fill_count} | Remaining: {remaining}")
-                    else:
-                        self.log(f"{self.get_datetime()} [ORDER RESPONSE] {response}")
-                except Exception as e:
-                    ticker = order.get('ticker', 'N/A')
-                    error_msg = str(e)
-                    
-                    # Try to extract API error details if it's an HTTPError
-                    if hasattr(e, 'response') and hasattr(e.response, '_error_details'):
-                        api_error = e.response._error_details
-                        error_msg += f" | API Error: {api_error}"
-                    elif "API Error Response" in str(e):
-                        # Fallback: extract from error message if available
-                        pass
-                    
-                    self.log(f"{self.get_datetime()} [ERROR] Failed to place order for {ticker}: {error_msg}")
-                    
-                    # Log order details for debugging
-                    self.log(f"{self.get_datetime()} [ERROR] Order details: Ticker={ticker}, Side={side}, Action={action}, Count={count}, Type={order_type}, Price={price}")
-                    self.log(f"{self.get_datetime()} [ERROR] Traceback: {traceback.format_exc()}")
+        # quotes on deselected tickers are cancelled, unchanged ones are kept
+        tickers = set(self.trade.get_open_trade_orders())
+        tickers.update(quote['ticker'] for quote in self.quotes.get_quotes())
+        self.requote(list(tickers))
+
+    def submit_orders(self, market_orders: list):
+        """Risk-checks, journals and submits opening orders; resting ones become managed quotes."""
+        submissions = []
+        for order in market_orders:
+            pending_key = f"pending:{order.get('ticker', 'N/A')}"
+            reject_reason = self.risk.check_order(order)
+            if reject_reason is not None:
+                self.portfolio.release(pending_key)
+                self.log(f"{self.get_datetime()} [RISK REJECT] Ticker: {order['ticker']} | Reason: {reject_reason}")
+                continue
+            ticker = order.get('ticker', 'N/A')
+            side = order.get('side', 'N/A')
+            action = order.get('action', 'N/A')
+            count = order.get('count', 0)
+            order_type = order.get('type', 'N/A')
+            yes_price = order.get('yes_price_dollars', None)
+            no_price = order.get('no_price_dollars', None)
+            price = yes_price if side == 'yes' else no_price
+
+            title = order.get('title', 'N/A')
+            rules_primary = order.get('rules_primary', 'N/A')
+            yes_qty = order.get('yes_qty', 0)
+            no_qty = order.get('no_qty', 0)
+            yes_price = order.get('yes_price', 0)
+            no_price = order.get('no_price', 0)
+
+            self.log(f"{self.get_datetime()} [OPEN ORDER] Ticker: {ticker} | Title: {title} | Rules Primary: {rules_primary}")
+            self.log(f"  └─ Side: {side} | Action: {action} | Count: {count} | Type: {order_type} | Price: {price}")
+            self.log(f"  └─ Market Yes Price: ${order['market_yes_price']:.4f} | Market No Price: ${order['market_no_price']:.4f}")
+            self.log(f"  └─ Market Book: Yes Qty: {yes_qty} | No Qty: {no_qty} | Yes Price: ${yes_price:.4f} | No Price: ${no_price:.4f}")
+
+            # Extract price values for API call
+            yes_price_dollars = order.get('yes_price_dollars', None)
+            no_price_dollars = order.get('no_price_dollars', None)
+
+            client_order_id = str(uuid.uuid4())
+            self.journal.record_intent(client_order_id, {
+                'client_order_id': client_order_id,
+                'ticker': order['ticker'],
+                'side': order['side'],
+                'action': order['action'],
+                'count': order['count'],
+                'yes_price_dollars': yes_price_dollars,
+                'no_price_dollars': no_price_dollars,
+            })
+            submissions.append((order, pending_key, {
+                'ticker': order['ticker'],
+                'side': order['side'],
+                'action': order['action'],
+                'count': order['count'],
+                'type': order['type'],
+                'yes_price_dollars': yes_price_dollars,
+                'no_price_dollars': no_price_dollars,
+                'expiration_ts': order['expiration_ts'],
+                'client_order_id': client_order_id,
+            }))
+
+        with self.profiler.phase('place'):
+            results = self.client.map(
+                lambda submission: self.client.create_open_order(**submission[2]), submissions
+            )
+        for (order, pending_key, submission), response in zip(submissions, results):
+            if not isinstance(response, Exception) and response and 'order' in response:
+                self.portfolio.apply_order_response(response['order'])
+            self.portfolio.release(pending_key)
+            self.risk.release_order(order)
+            if isinstance(response, Exception) or not response or 'order' not in response:
+                # an order that did land is picked up by the next reconciliation, forced here
+                self.journal.record_abandon(submission['client_order_id'])
+                self.portfolio.invalidate()
+            if isinstance(response, Exception):
+                self.log_order_error(order, response)
+                continue
+
+            # Format response
+            if response and 'order' in response:
+                resp_order = response['order']
+                self.journal.record_ack(resp_order)
+                if resp_order.get('status') not in ['canceled', 'filled', 'executed'] and 'order_id' in resp_order:
+                    self.quotes.add({**order, 'order_id': resp_order['order_id']}, QUOTE_TTL)
+                order_id = resp_order.get('order_id', 'N/A')
+                status = resp_order.get('status', 'N/A')
+                fill_count = resp_order.get('fill_count', 0)
+                remaining = resp_order.get('remaining_count', 0)
+                self.log(f"{self.get_datetime()} [ORDER RESPONSE] OrderID: {order_id[:8]}... | Status: {status} | Filled: {fill_count} | Remaining: {remaining}")
+            else:
+                self.log(f"{self.get_datetime()} [ORDER RESPONSE] {response}")
+
+    def log_order_error(self, order: dict, e: Exception):
+        ticker = order.get('ticker', 'N/A')
+        side = order.get('side', 'N/A')
+        price = order.get('yes_price_dollars') if side == 'yes' else order.get('no_price_dollars')
+        error_msg = str(e)
+
+        # Try to extract API error details if it's an HTTPError
+        if hasattr(e, 'response') and hasattr(e.response, '_error_details'):
+            api_error = e.response._error_details
+            error_msg += f" | API Error: {api_error}"
+
+        self.log(f"{self.get_datetime()} [ERROR] Failed to place order for {ticker}: {error_msg}")
+
+        # Log order details for debugging
+        self.log(f"{self.get_datetime()} [ERROR] Order details: Ticker={ticker}, Side={side}, Action={order.get('action', 'N/A')}, Count={order.get('count', 0)}, Type={order.get('type', 'N/A')}, Price={price}")
+        self.log(f"{self.get_datetime()} [ERROR] Traceback: {''.join(traceback.format_exception(type(e), e, e.__traceback__))}")
+
+    def begin_profile_cycle(self):
+        if self.profiler.begin_cycle():
+            self.log(f"{self.get_datetime()} [PROFILE] Started for {PROFILE_CYCLES} cycles")
+
+    def end_profile_cycle(self):
+        try:
+            profile_paths = self.profiler.end_cycle()
+        except Exception as e:
+            self.log(f"{self.get_datetime()} [ERROR] Failed to write profile: {str(e)}")
+            return
+        if profile_paths:
+            self.log(f"{self.get_datetime()} [PROFILE] Flame graph stacks: {profile_paths[0]} | cProfile stats: {profile_paths[1]}")
 
     def run(self):
         """Main trading loop with error handling - keeps running even if errors occur."""
 
+        self.sync_clock()
+        self.resume_from_journal()
+        self.start_portfolio_stream()
+        if self.profiler.install_signal_handlers():
+            self.log(f"{self.get_datetime()} [PROFILE] kill -USR1 {os.getpid()} profiles the next {PROFILE_CYCLES} cycles, kill -USR2 {os.getpid()} stops early")
         while True:
             try:
+                self.begin_profile_cycle()
+                self.accrue_incentives()
                 self.start_trading()
+                self.resume_order_ids = set()
+                self.catch_up_fills()
+                self.journal.flush()
+                if self.journal.needs_compact():
+                    self.journal.compact()
                 self.log(f"{self.get_datetime()} [HISTORICAL TRADE count] {len(self.historical_trade_list)}")
+                self.log_pnl()
+                self.log_latency()
+                self.analytics.maybe_flush()
             except KeyboardInterrupt:
                 self.log(f"{self.get_datetime()} [SHUTDOWN] Received interrupt signal, shutting down gracefully")
                 raise  # Re-raise to allow clean shutdown
@@ -283,36 +647,9 @@ class MARKET_BOT:
                 self.log(f"{self.get_datetime()} [ERROR] Traceback: {traceback.format_exc()}")
                 self.log(f"{self.get_datetime()} [INFO] Continuing to next iteration in {self.wait_time} seconds...")
             finally:
-                time.sleep(self.wait_time)
+                self.wait_for_next_cycle()
+                self.end_profile_cycle()
 
 if __name__ == "__main__":
-    # Load environment variables
-    load_dotenv()
-    env = Environment.PROD # toggle environment here
-    KEYID = os.getenv('DEMO_KEYID') if env == Environment.DEMO else os.getenv('PROD_KEYID')
-    KEYFILE = os.getenv('DEMO_KEYFILE') if env == Environment.DEMO else os.getenv('PROD_KEYFILE')
-
-    try:
-        with open(KEYFILE, "rb") as key_file:
-            private_key = serialization.load_pem_private_key(
-                key_file.read(),
-                password=None  # Provide the password if your key is encrypted
-            )
-    except FileNotFoundError:
-        raise FileNotFoundError(f"Private key file not found at {KEYFILE}")
-    except Exception as e:
-        raise Exception(f"Error loading private key: {str(e)}")
-
-    # Initialize the HTTP client
-    client = KalshiHttpClient(
-        key_id=KEYID,
-        private_key=private_key,
-        environment=env
-    )
-
-    incentive_program = INCENTIVE_PROGRAM()
-    trade = TRADE()
-    market_bot = MARKET_BOT(incentive_program, trade, client)
-    market_bot.run()
-
-
+    from main import main
+    main(["run"])
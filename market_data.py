@@ -0,0 +1,229 @@
+import json
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+
+SHM_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+MARKET_DATA_FILE = os.path.join(SHM_DIR, "kalshi_market_data")
+
+# Layout: magic | generation | latest slot | capacity | two slot headers (seq, length, written_at) | two payload slots
+MAGIC = b"KMDSHM02"
+HEADER = struct.Struct("<8sQQQ")
+SLOT_HEADER = struct.Struct("<QQd")
+SLOT_COUNT = 2
+PAYLOAD_OFFSET = HEADER.size + SLOT_COUNT * SLOT_HEADER.size
+
+
+def _slot_header_offset(slot: int) -> int:
+    return HEADER.size + slot * SLOT_HEADER.size
+
+
+class MARKET_DATA_WRITER:
+    """Publishes market-data snapshots into a shared-memory ring of two seqlocked slots.
+
+    Each write goes to the slot readers are not pointed at, so a reader only
+    has to retry when it is lapped by two consecutive writes.
+    """
+
+    def __init__(self, path: str = MARKET_DATA_FILE, capacity: int = 16 * 1024 * 1024):
+        self.path = path
+        self.capacity = capacity
+        size = PAYLOAD_OFFSET + SLOT_COUNT * capacity
+        # never truncate the live file: a reader mapping past its new end would
+        # die of SIGBUS. A fresh file replaces it and readers remap on the inode change.
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        fd = os.open(tmp_path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.ftruncate(fd, size)
+            self.mm = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        # a new generation per writer start, so readers never mistake a
+        # restarted daemon's (slot, seq) for the snapshot they already hold
+        self.generation = int.from_bytes(os.urandom(8), 'little')
+        self.latest = 0
+        self.seqs = [0] * SLOT_COUNT
+        for slot in range(SLOT_COUNT):
+            SLOT_HEADER.pack_into(self.mm, _slot_header_offset(slot), 0, 0, 0.0)
+        HEADER.pack_into(self.mm, 0, MAGIC, self.generation, self.latest, capacity)
+        os.replace(tmp_path, path)
+
+    def write(self, snapshot: dict):
+        payload = json.dumps(snapshot, separators=(',', ':')).encode('utf-8')
+        if len(payload) > self.capacity:
+            raise ValueError(f"Market data snapshot of {len(payload)} bytes exceeds capacity {self.capacity}")
+
+        slot = (self.latest + 1) % SLOT_COUNT
+        header_offset = _slot_header_offset(slot)
+        # odd sequence number marks the slot as being written
+        self.seqs[slot] += 1
+        struct.pack_into("<Q", self.mm, header_offset, self.seqs[slot])
+        payload_offset = PAYLOAD_OFFSET + slot * self.capacity
+        self.mm[payload_offset:payload_offset + len(payload)] = payload
+        self.seqs[slot] += 1
+        SLOT_HEADER.pack_into(self.mm, header_offset, self.seqs[slot], len(payload), time.time())
+        self.latest = slot
+        HEADER.pack_into(self.mm, 0, MAGIC, self.generation, self.latest, self.capacity)
+
+    def close(self):
+        self.mm.close()
+
+
+class MARKET_DATA_CACHE:
+    """Reads the latest snapshot published by the market-data daemon.
+
+    Safe to share between threads (e.g. the HTTP pool workers).
+    """
+
+    def __init__(self, path: str = MARKET_DATA_FILE, max_age: float = 30, retries: int = 5):
+        self.path = path
+        self.max_age = max_age
+        self.retries = retries
+        self.mm = None
+        self.file_id = None
+        self.snapshot = None
+        self.snapshot_key = None
+        self.lock = threading.Lock()
+
+    def _open(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            self._close()
+            return False
+        # a restarted daemon replaces the file; drop the mapping of the old one
+        if self.mm is not None and self.file_id != (stat.st_dev, stat.st_ino):
+            self._close()
+        if self.mm is None:
+            try:
+                with open(self.path, "rb") as f:
+                    self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                    stat = os.fstat(f.fileno())
+                self.file_id = (stat.st_dev, stat.st_ino)
+            except (OSError, ValueError):
+                return False
+        return True
+
+    def read(self):
+        """Returns the latest snapshot, or None if the daemon is down or the data is stale."""
+        with self.lock:
+            if not self._open():
+                return None
+            try:
+                return self._read()
+            except (ValueError, struct.error):
+                # the mapping does not match its header; remap on the next read
+                self._close()
+                return None
+
+    def _read(self):
+        for _ in range(self.retries):
+            magic, generation, latest, capacity = HEADER.unpack_from(self.mm, 0)
+            if magic != MAGIC:
+                return None
+            payload_offset = PAYLOAD_OFFSET + latest * capacity
+            if latest >= SLOT_COUNT or payload_offset + capacity > len(self.mm):
+                raise ValueError("Market data file does not match its header")
+            header_offset = _slot_header_offset(latest)
+            seq, length, written_at = SLOT_HEADER.unpack_from(self.mm, header_offset)
+            if seq % 2 or seq == 0:
+                continue
+            if time.time() - written_at > self.max_age:
+                return None
+            if self.snapshot_key == (generation, latest, seq):
+                return self.snapshot
+            payload = self.mm[payload_offset:payload_offset + length]
+            if SLOT_HEADER.unpack_from(self.mm, header_offset)[0] != seq:
+                continue
+            self.snapshot = json.loads(payload)
+            self.snapshot_key = (generation, latest, seq)
+            return self.snapshot
+        return None
+
+    def _close(self):
+        if self.mm is not None:
+            self.mm.close()
+            self.mm = None
+            self.file_id = None
+
+    def close(self):
+        with self.lock:
+            self._close()
+
+
+class MARKET_DATA_SOURCE:
+    """Serves incentives, markets and order books from the shared snapshot, falling back to the API."""
+
+    def __init__(self, client, cache: MARKET_DATA_CACHE):
+        self.client = client
+        self.cache = cache
+
+    def get_market_incentive(self):
+        snapshot = self.cache.read()
+        if snapshot is not None:
+            return {'incentive_programs': snapshot['incentive_programs']}
+        return self.client.get_market_incentive()
+
+    def get_market_ticker(self, ticker: str):
+        snapshot = self.cache.read()
+        if snapshot is not None and ticker in snapshot['markets']:
+            return {'market': snapshot['markets'][ticker]}
+        return self.client.get_market_ticker(ticker)
+
+    def get_market_ticker_order_book(self, ticker: str, depth: int = None):
+        snapshot = self.cache.read()
+        if snapshot is not None and ticker in snapshot['orderbooks']:
+            order_book = snapshot['orderbooks'][ticker]
+            if depth:
+                # levels are sorted by price, best bid last
+                order_book = {side: levels[-depth:] if levels else levels for side, levels in order_book.items()}
+            return {'orderbook': order_book}
+        return self.client.get_market_ticker_order_book(ticker, depth)
+
+
+class MARKET_DATA_DAEMON:
+    """Fetches incentives, market metadata and order books once for every bot on the host."""
+
+    def __init__(self, client, writer: MARKET_DATA_WRITER, interval: float = 10):
+        self.client = client
+        self.writer = writer
+        self.interval = interval
+
+    def fetch_snapshot(self):
+        incentives = self.client.get_market_incentive()['incentive_programs']
+        tickers = sorted({
+            incentive['market_ticker'] for incentive in incentives
+            if incentive['paid_out'] == False and incentive['incentive_type'] == 'liquidity'
+        })
+        markets = {}
+        for ticker, result in zip(tickers, self.client.map(self.client.get_market_ticker, tickers)):
+            if not isinstance(result, Exception):
+                markets[ticker] = result['market']
+        orderbooks = {}
+        for ticker, result in zip(tickers, self.client.map(self.client.get_market_ticker_order_book, tickers)):
+            if not isinstance(result, Exception):
+                orderbooks[ticker] = result['orderbook']
+        return {
+            'ts': time.time(),
+            'incentive_programs': incentives,
+            'markets': markets,
+            'orderbooks': orderbooks,
+        }
+
+    def run(self):
+        while True:
+            started = time.time()
+            try:
+                snapshot = self.fetch_snapshot()
+                self.writer.write(snapshot)
+                print(f"{datetime_str()} [MARKET DATA] Published {len(snapshot['orderbooks'])} order books")
+            except Exception as e:
+                print(f"{datetime_str()} [ERROR] Failed to publish market data: {str(e)}")
+            time.sleep(max(0, self.interval - (time.time() - started)))
+
+
+def datetime_str():
+    return time.strftime("%Y-%m-%d %H:%M:%S")
@@ -0,0 +1,286 @@
+import json
+import threading
+import time
+
+CLOSED_ORDER_STATUSES = ['canceled', 'filled', 'executed']
+# fill bookkeeping kept for orders that are no longer resting, so late
+# stream fills for them are not applied on top of a REST snapshot
+CLOSED_ORDER_FILLS_MAX = 1000
+
+
+def event_ticker(ticker: str) -> str:
+    """Returns the event of a market ticker, e.g. KXHIGHCHI-26JAN16 for KXHIGHCHI-26JAN16-B35.5."""
+    return ticker.rsplit('-', 1)[0]
+
+
+class PORTFOLIO:
+
+    __instance = None
+
+    def __new__(cls):
+        if cls.__instance is None:
+            cls.__instance = super(PORTFOLIO, cls).__new__(cls)
+            cls.__instance._lock = threading.RLock()
+            cls.__instance.positions = {}
+            cls.__instance.resting_orders = {}
+            cls.__instance.reserved = {}
+            cls.__instance.balance = 0
+            cls.__instance.last_reconcile = None
+            # order_id -> fill bookkeeping, so fills reported by both the
+            # WebSocket stream and order responses are only applied once
+            cls.__instance.order_fills = {}
+            cls.__instance.reconcile_interval = 0
+            cls.__instance._reset_exposure()
+        return cls.__instance
+
+    @property
+    def reconcile_interval(self):
+        return self.__reconcile_interval
+
+    @reconcile_interval.setter
+    def reconcile_interval(self, value: int):
+        self.__reconcile_interval = value
+
+    @staticmethod
+    def _price_cents(order: dict, side: str) -> int:
+        """Returns the order price for the given side in cents."""
+        price_dollars = order.get(f"{side}_price_dollars")
+        if price_dollars is not None:
+            return int(round(float(price_dollars) * 100))
+        return int(order.get(f"{side}_price") or 0)
+
+    @staticmethod
+    def _position_sign(side: str, action: str) -> int:
+        # positive position = long yes, negative = long no
+        if (side == 'yes') == (action == 'buy'):
+            return 1
+        return -1
+
+    def _reset_exposure(self):
+        # exposure in contracts (|position| + resting buy count), kept
+        # incrementally per ticker, per event and in aggregate
+        self.resting_counts = {}
+        self.ticker_resting = {}
+        self.exposure = {}
+        self.event_exposure = {}
+        self.total_exposure = 0
+
+    def _update_exposure(self, ticker: str):
+        new_exposure = abs(self.positions.get(ticker, 0)) + self.ticker_resting.get(ticker, 0)
+        delta = new_exposure - self.exposure.get(ticker, 0)
+        if delta == 0:
+            return
+        if new_exposure:
+            self.exposure[ticker] = new_exposure
+        else:
+            self.exposure.pop(ticker, None)
+        event = event_ticker(ticker)
+        event_exposure = self.event_exposure.get(event, 0) + delta
+        if event_exposure:
+            self.event_exposure[event] = event_exposure
+        else:
+            self.event_exposure.pop(event, None)
+        self.total_exposure += delta
+
+    def _set_resting_count(self, order_id: str, ticker: str, count: int):
+        old_ticker, old_count = self.resting_counts.pop(order_id, (ticker, 0))
+        if old_count:
+            self.ticker_resting[old_ticker] -= old_count
+            if not self.ticker_resting[old_ticker]:
+                self.ticker_resting.pop(old_ticker)
+        if count > 0:
+            self.resting_counts[order_id] = (ticker, count)
+            self.ticker_resting[ticker] = self.ticker_resting.get(ticker, 0) + count
+        self._update_exposure(old_ticker)
+        if ticker != old_ticker:
+            self._update_exposure(ticker)
+
+    def needs_reconcile(self):
+        if self.last_reconcile is None:
+            return True
+        return time.time() - self.last_reconcile >= self.__reconcile_interval
+
+    def invalidate(self):
+        """Forces a REST reconciliation on the next cycle."""
+        with self._lock:
+            self.last_reconcile = None
+
+    def reconcile(self, positions: list, orders: list, balance: int):
+        """Replaces the local state with a REST snapshot."""
+        with self._lock:
+            self.positions = {}
+            self._reset_exposure()
+            for position in positions or []:
+                if position.get('position', 0) != 0:
+                    self.positions[position['ticker']] = position['position']
+                    self._update_exposure(position['ticker'])
+
+            self.resting_orders = {}
+            self.reserved = {key: amount for key, amount in self.reserved.items() if key.startswith('pending:')}
+            order_fills = {}
+            for order in orders or []:
+                if order.get('status') in CLOSED_ORDER_STATUSES:
+                    continue
+                order_id = order['order_id']
+                self.resting_orders[order_id] = order
+                fill_count = order.get('fill_count', 0) or 0
+                order_fills[order_id] = self._new_fill_entry(order, applied=fill_count)
+                if order_id in self.order_fills:
+                    order_fills[order_id]['trade_ids'] = self.order_fills[order_id]['trade_ids']
+                self._reserve_order(order)
+            # closed orders keep their counts: the snapshot already includes their fills
+            closed_ids = [order_id for order_id in self.order_fills if order_id not in order_fills]
+            for order_id in closed_ids[-CLOSED_ORDER_FILLS_MAX:]:
+                order_fills[order_id] = self.order_fills[order_id]
+            self.order_fills = order_fills
+
+            self.balance = balance
+            self.last_reconcile = time.time()
+
+    def _new_fill_entry(self, order: dict, applied: int = 0):
+        side = order.get('side', 'yes')
+        return {
+            'ticker': order.get('ticker') or order.get('market_ticker'),
+            'side': side,
+            'action': order.get('action', 'buy'),
+            'price': self._price_cents(order, side),
+            # fills up to `applied` are already in the position, from either source
+            'reported': applied,
+            'streamed': applied,
+            'applied': applied,
+            'trade_ids': set(),
+        }
+
+    @staticmethod
+    def _order_count(order: dict) -> int:
+        count = order.get('initial_count', order.get('count'))
+        if count is not None:
+            return int(count)
+        return (order.get('fill_count') or 0) + (order.get('remaining_count') or 0)
+
+    def _drop_resting(self, order_id: str):
+        self.resting_orders.pop(order_id, None)
+        self.reserved.pop(order_id, None)
+        if order_id in self.resting_counts:
+            self._set_resting_count(order_id, self.resting_counts[order_id][0], 0)
+
+    def _reserve_order(self, order: dict):
+        order_id = order['order_id']
+        ticker = order.get('ticker') or order.get('market_ticker')
+        if order.get('action') != 'buy' or order.get('status') in CLOSED_ORDER_STATUSES:
+            self.reserved.pop(order_id, None)
+            self._set_resting_count(order_id, ticker, 0)
+            return
+        remaining = order.get('remaining_count', order.get('count', 0)) or 0
+        self.reserved[order_id] = self._price_cents(order, order.get('side', 'yes')) * remaining
+        self._set_resting_count(order_id, ticker, remaining)
+
+    def _sync_order_fills(self, order_id: str):
+        entry = self.order_fills[order_id]
+        target = max(entry['reported'], entry['streamed'])
+        delta = target - entry['applied']
+        if delta <= 0:
+            return
+        ticker = entry['ticker']
+        position = self.positions.get(ticker, 0) + self._position_sign(entry['side'], entry['action']) * delta
+        if position == 0:
+            self.positions.pop(ticker, None)
+        else:
+            self.positions[ticker] = position
+        self._update_exposure(ticker)
+        if order_id in self.resting_counts:
+            resting_ticker, resting_count = self.resting_counts[order_id]
+            self._set_resting_count(order_id, resting_ticker, max(0, resting_count - delta))
+
+        cost = entry['price'] * delta
+        if entry['action'] == 'buy':
+            self.balance -= cost
+            if order_id in self.reserved:
+                self.reserved[order_id] = max(0, self.reserved[order_id] - cost)
+        else:
+            self.balance += cost
+        entry['applied'] = target
+        # a fully filled order stops resting even before its user_order update arrives
+        order = self.resting_orders.get(order_id)
+        if order is not None and target >= self._order_count(order):
+            self._drop_resting(order_id)
+
+    def apply_order_response(self, order: dict):
+        """Updates resting orders, reservations and positions from an order payload."""
+        if not order or 'order_id' not in order:
+            return
+        with self._lock:
+            order_id = order['order_id']
+            if order_id not in self.order_fills:
+                self.order_fills[order_id] = self._new_fill_entry(order)
+            entry = self.order_fills[order_id]
+            entry['reported'] = max(entry['reported'], order.get('fill_count', 0) or 0)
+            self._sync_order_fills(order_id)
+
+            if order.get('status') in CLOSED_ORDER_STATUSES:
+                self.resting_orders.pop(order_id, None)
+            else:
+                self.resting_orders[order_id] = order
+            self._reserve_order(order)
+            if order_id in self.resting_orders and entry['applied'] >= self._order_count(order):
+                self._drop_resting(order_id)
+
+    def apply_fill(self, fill: dict):
+        """Updates positions and cash from a WebSocket fill message."""
+        order_id = fill.get('order_id')
+        if order_id is None:
+            return
+        with self._lock:
+            if order_id not in self.order_fills:
+                self.order_fills[order_id] = self._new_fill_entry(fill)
+            entry = self.order_fills[order_id]
+            trade_id = fill.get('trade_id')
+            if trade_id is not None:
+                if trade_id in entry['trade_ids']:
+                    return
+                entry['trade_ids'].add(trade_id)
+            entry['streamed'] += fill.get('count', 0) or 0
+            self._sync_order_fills(order_id)
+
+    def apply_cancel(self, order_id: str):
+        with self._lock:
+            self._drop_resting(order_id)
+
+    def on_ws_message(self, message: str):
+        """Handles `fill` and `user_order` messages from the WebSocket client."""
+        data = json.loads(message)
+        msg = data.get('msg') or {}
+        if data.get('type') == 'fill':
+            self.apply_fill(msg)
+        elif data.get('type') == 'user_order':
+            self.apply_order_response(msg)
+
+    def reserve(self, key: str, amount: int):
+        """Reserves cash (in cents) for an in-flight order."""
+        with self._lock:
+            self.reserved[key] = amount
+
+    def release(self, key: str):
+        with self._lock:
+            self.reserved.pop(key, None)
+
+    def available_balance(self):
+        with self._lock:
+            return self.balance - sum(self.reserved.values())
+
+    def get_exposure(self, ticker: str):
+        """Returns (ticker, event, total) exposure in contracts."""
+        with self._lock:
+            return (
+                self.exposure.get(ticker, 0),
+                self.event_exposure.get(event_ticker(ticker), 0),
+                self.total_exposure,
+            )
+
+    def get_positions(self):
+        with self._lock:
+            return dict(self.positions)
+
+    def get_resting_orders(self):
+        with self._lock:
+            return list(self.resting_orders.values())
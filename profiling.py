@@ -0,0 +1,163 @@
+import cProfile
+import os
+import select
+import signal
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+
+class PROFILER:
+    """On-demand profiling of the trading loop, toggled by signals.
+
+    SIGUSR1 profiles the next `cycles` cycles, SIGUSR2 stops early. While
+    active, a sampling thread records the stacks of every thread tagged with
+    its phase (written as collapsed stacks for flame graphs), and
+    cProfile records the main thread (written as a .prof pstats file).
+    Time spent in sleep() is not profiled, and a signal ends the sleep early.
+    """
+
+    def __init__(self, directory: str, cycles: int = 3, interval: float = 0.01):
+        self.directory = directory
+        self.cycles = cycles
+        self.interval = interval
+        # thread ident -> stack of phases entered on that thread
+        self.phases = {}
+        self.requested = None
+        self.active = False
+        self.remaining_cycles = 0
+        self.samples = {}
+        self.sampler = None
+        self.profile = None
+        self.sleeping = False
+        # self-pipe written by the signal handlers to wake sleep()
+        self.wakeup_fds = None
+
+    def install_signal_handlers(self):
+        """Installs the SIGUSR1/SIGUSR2 handlers; returns False where they are unavailable."""
+        if not hasattr(signal, 'SIGUSR1') or threading.current_thread() is not threading.main_thread():
+            return False
+        self.wakeup_fds = os.pipe()
+        for fd in self.wakeup_fds:
+            os.set_blocking(fd, False)
+        signal.signal(signal.SIGUSR1, lambda signum, frame: self.request(True))
+        signal.signal(signal.SIGUSR2, lambda signum, frame: self.request(False))
+        return True
+
+    def request(self, start: bool):
+        # handlers only record the request and wake sleep(); the loop acts on it
+        self.requested = start
+        if self.wakeup_fds is not None:
+            try:
+                os.write(self.wakeup_fds[1], b'\0')
+            except OSError:
+                pass
+
+    def sleep(self, seconds: float):
+        """Sleeps up to seconds, returning early when a start or stop request arrives."""
+        if self.active:
+            self.profile.disable()
+            self.sleeping = True
+        try:
+            if self.wakeup_fds is None:
+                time.sleep(seconds)
+                return
+            select.select([self.wakeup_fds[0]], [], [], seconds)
+            try:
+                os.read(self.wakeup_fds[0], 4096)
+            except OSError:
+                pass
+        finally:
+            if self.sleeping:
+                self.sleeping = False
+                self.profile.enable()
+
+    @contextmanager
+    def phase(self, name: str):
+        phases = self.phases.setdefault(threading.get_ident(), [])
+        phases.append(name)
+        try:
+            yield
+        finally:
+            phases.pop()
+
+    def begin_cycle(self):
+        """Starts profiling if it was requested; returns True when it just started."""
+        if self.requested is True and not self.active:
+            self.requested = None
+            self.start(self.cycles)
+            return True
+        return False
+
+    def end_cycle(self):
+        """Counts down the profiled cycles; returns the dumped file paths when profiling stops."""
+        if not self.active:
+            self.requested = None
+            return None
+        self.remaining_cycles -= 1
+        if self.requested is False or self.remaining_cycles <= 0:
+            self.requested = None
+            return self.stop()
+        return None
+
+    def start(self, cycles: int):
+        self.samples = {}
+        self.remaining_cycles = cycles
+        self.active = True
+        self.sampler = threading.Thread(target=self._sample, daemon=True)
+        self.sampler.start()
+        self.profile = cProfile.Profile()
+        self.profile.enable()
+
+    def stop(self):
+        """Stops profiling and writes `<stamp>.folded` and `<stamp>.prof`; returns their paths."""
+        self.profile.disable()
+        self.active = False
+        self.sampler.join()
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        folded_path = os.path.join(self.directory, f"profile-{stamp}.folded")
+        with open(folded_path, 'w') as f:
+            for stack, count in sorted(self.samples.items()):
+                f.write(f"{stack} {count}\n")
+        stats_path = os.path.join(self.directory, f"profile-{stamp}.prof")
+        self.profile.dump_stats(stats_path)
+        self.profile = None
+        return folded_path, stats_path
+
+    @staticmethod
+    def _frame_names(frame):
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+            frame = frame.f_back
+        names.reverse()
+        return names
+
+    def _current_phase(self, ident: int):
+        try:
+            return self.phases.get(ident, [])[-1]
+        except IndexError:
+            # the thread has no phase open (or just left its last one)
+            return None
+
+    def _sample(self):
+        sampler_ident = threading.get_ident()
+        main_ident = threading.main_thread().ident
+        while self.active:
+            if self.sleeping:
+                time.sleep(self.interval)
+                continue
+            # threads without a phase of their own (e.g. the HTTP pool) run on behalf of the main thread's
+            main_phase = self._current_phase(main_ident) or 'idle'
+            # pool workers share one name (ThreadPoolExecutor-0_3 -> ThreadPoolExecutor-0)
+            thread_names = {thread.ident: thread.name.rsplit('_', 1)[0] for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == sampler_ident:
+                    continue
+                phase = self._current_phase(ident) or main_phase
+                stack = ';'.join([phase, thread_names.get(ident, str(ident))] + self._frame_names(frame))
+                self.samples[stack] = self.samples.get(stack, 0) + 1
+            time.sleep(self.interval)
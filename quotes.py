@@ -0,0 +1,108 @@
+import time
+
+
+class QUOTE_MANAGER:
+    """Tracks our resting quotes on a hashed timer wheel of refresh deadlines.
+
+    Deadlines are on the monotonic clock.
+
+    Each quote gets its own deadline; advance() returns the quotes whose
+    deadline has passed by visiting only the wheel slots for elapsed ticks.
+    """
+
+    def __init__(self, tick: float = 1.0, slots: int = 4096):
+        self.tick = tick
+        self.slots = slots
+        self.wheel = [set() for _ in range(slots)]
+        self.quotes = {}
+        self.ticker_quotes = {}
+        self.current_tick = int(time.monotonic() / tick)
+
+    @staticmethod
+    def _quote_price(order: dict) -> float:
+        side = order.get('side', 'yes')
+        if order.get(f"{side}_price_dollars") is not None:
+            return float(order[f"{side}_price_dollars"])
+        return float(order.get(f"{side}_price") or 0) / 100
+
+    def _schedule(self, order_id: str, deadline: float):
+        tick_index = max(int(deadline / self.tick), self.current_tick)
+        self.quotes[order_id]['deadline'] = deadline
+        self.quotes[order_id]['tick_index'] = tick_index
+        self.quotes[order_id]['scheduled'] = True
+        self.wheel[tick_index % self.slots].add(order_id)
+
+    def _unschedule(self, order_id: str):
+        quote = self.quotes[order_id]
+        self.wheel[quote['tick_index'] % self.slots].discard(order_id)
+        quote['scheduled'] = False
+
+    def add(self, order: dict, ttl: float):
+        """Starts managing a resting order, refreshing it ttl seconds from now."""
+        order_id = order['order_id']
+        ticker = order.get('ticker')
+        if ticker in self.ticker_quotes and self.ticker_quotes[ticker] != order_id:
+            self.remove(self.ticker_quotes[ticker])
+        if order_id in self.quotes:
+            self._unschedule(order_id)
+        self.quotes[order_id] = {
+            'order_id': order_id,
+            'ticker': ticker,
+            'side': order.get('side'),
+            'price': self._quote_price(order),
+            'order': order,
+        }
+        self.ticker_quotes[ticker] = order_id
+        self._schedule(order_id, time.monotonic() + ttl)
+
+    def reschedule(self, order_id: str, ttl: float):
+        if order_id not in self.quotes:
+            return
+        self._unschedule(order_id)
+        self._schedule(order_id, time.monotonic() + ttl)
+
+    def remove(self, order_id: str):
+        if order_id not in self.quotes:
+            return
+        self._unschedule(order_id)
+        quote = self.quotes.pop(order_id)
+        if self.ticker_quotes.get(quote['ticker']) == order_id:
+            self.ticker_quotes.pop(quote['ticker'])
+
+    def prune(self, resting_order_ids: set):
+        """Forgets quotes that are no longer resting (filled, expired or cancelled elsewhere)."""
+        for order_id in [order_id for order_id in self.quotes if order_id not in resting_order_ids]:
+            self.remove(order_id)
+
+    def advance(self, now: float = None):
+        """Returns the quotes whose refresh deadline has passed.
+
+        Returned quotes are off the wheel until they are rescheduled.
+        """
+        now = time.monotonic() if now is None else now
+        now_tick = int(now / self.tick)
+        due = []
+        # a full turn of the wheel visits every slot
+        first_tick = max(self.current_tick, now_tick - self.slots + 1)
+        for tick_index in range(first_tick, now_tick + 1):
+            slot = self.wheel[tick_index % self.slots]
+            for order_id in [order_id for order_id in slot if self.quotes[order_id]['tick_index'] <= now_tick]:
+                slot.discard(order_id)
+                self.quotes[order_id]['scheduled'] = False
+                due.append(self.quotes[order_id])
+        self.current_tick = now_tick + 1
+        return due
+
+    def next_deadline(self):
+        deadlines = [quote['deadline'] for quote in self.quotes.values() if quote['scheduled']]
+        return min(deadlines) if deadlines else None
+
+    def is_managed(self, order_id: str):
+        return order_id in self.quotes
+
+    def get_ticker_quote(self, ticker: str):
+        order_id = self.ticker_quotes.get(ticker)
+        return self.quotes.get(order_id) if order_id is not None else None
+
+    def get_quotes(self):
+        return list(self.quotes.values())
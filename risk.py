@@ -0,0 +1,96 @@
+import threading
+import time
+
+from portfolio import PORTFOLIO, event_ticker
+
+
+class RISK_ENGINE:
+    """Pre-trade checks for opening orders, each evaluated in constant time.
+
+    Exposure (in contracts) comes from the counters PORTFOLIO maintains
+    incrementally, plus orders approved here that are not yet acknowledged.
+    """
+
+    def __init__(
+        self,
+        portfolio: PORTFOLIO,
+        max_ticker_exposure: int,
+        max_event_exposure: int,
+        max_total_exposure: int,
+        max_order_rate: float,
+        price_band: float,
+    ):
+        self.portfolio = portfolio
+        self.max_ticker_exposure = max_ticker_exposure
+        self.max_event_exposure = max_event_exposure
+        self.max_total_exposure = max_total_exposure
+        self.max_order_rate = max_order_rate
+        self.price_band = price_band
+        self._lock = threading.Lock()
+        # token bucket holding at most one second of orders
+        self.tokens = float(max_order_rate)
+        self.last_refill = time.monotonic()
+        self.pending_ticker = {}
+        self.pending_event = {}
+        self.pending_total = 0
+
+    def _take_token(self) -> bool:
+        now = time.monotonic()
+        self.tokens = min(float(self.max_order_rate), self.tokens + (now - self.last_refill) * self.max_order_rate)
+        self.last_refill = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    def check_order(self, order: dict):
+        """Returns None if the opening order passes every check, else the rejection reason.
+
+        Accepted orders count as pending exposure until release_order is called.
+        """
+        ticker = order['ticker']
+        side = order['side']
+        count = int(order['count'])
+        price = float(order[f"{side}_price_dollars"])
+        other_side = 'no' if side == 'yes' else 'yes'
+        best_bid = float(order[f"market_{side}_price"])
+        # the best ask on our side is 1 - the best bid on the other side
+        best_ask = 1 - float(order[f"market_{other_side}_price"])
+
+        if not 0 < price < 1:
+            return f"price {price:.4f} outside (0, 1)"
+        if price >= best_ask:
+            return f"price {price:.4f} crosses best ask {best_ask:.4f}"
+        if abs(best_bid - price) > self.price_band:
+            return f"price {price:.4f} more than {self.price_band:.2f} from best bid {best_bid:.4f}"
+
+        event = event_ticker(ticker)
+        ticker_exposure, event_exposure, total_exposure = self.portfolio.get_exposure(ticker)
+        with self._lock:
+            if ticker_exposure + self.pending_ticker.get(ticker, 0) + count > self.max_ticker_exposure:
+                return f"ticker exposure limit {self.max_ticker_exposure}"
+            if event_exposure + self.pending_event.get(event, 0) + count > self.max_event_exposure:
+                return f"event exposure limit {self.max_event_exposure}"
+            if total_exposure + self.pending_total + count > self.max_total_exposure:
+                return f"total exposure limit {self.max_total_exposure}"
+            if not self._take_token():
+                return f"order rate limit {self.max_order_rate}/s"
+
+            self.pending_ticker[ticker] = self.pending_ticker.get(ticker, 0) + count
+            self.pending_event[event] = self.pending_event.get(event, 0) + count
+            self.pending_total += count
+        return None
+
+    def release_order(self, order: dict):
+        """Drops an accepted order from pending exposure once PORTFOLIO tracks it (or it failed)."""
+        ticker = order['ticker']
+        event = event_ticker(ticker)
+        count = int(order['count'])
+        with self._lock:
+            self.pending_ticker[ticker] = self.pending_ticker.get(ticker, 0) - count
+            if self.pending_ticker[ticker] <= 0:
+                self.pending_ticker.pop(ticker)
+            self.pending_event[event] = self.pending_event.get(event, 0) - count
+            if self.pending_event[event] <= 0:
+                self.pending_event.pop(event)
+            self.pending_total = max(0, self.pending_total - count)
@@ -0,0 +1,88 @@
+import heapq
+from array import array
+
+
+class REWARD_SCORER:
+    """Scores markets by expected incentive reward per dollar at risk.
+
+    Each ticker has one row holding its last inputs and score; a row is only
+    rescored when its book or incentive inputs change.
+    """
+
+    __instance = None
+
+    def __new__(cls):
+        if cls.__instance is None:
+            cls.__instance = super(REWARD_SCORER, cls).__new__(cls)
+            cls.__instance.rows = {}
+            cls.__instance.tickers = []
+            cls.__instance.price = array('d')
+            cls.__instance.trade_size = array('d')
+            cls.__instance.scores = array('d')
+            cls.__instance.inputs = []
+        return cls.__instance
+
+    @staticmethod
+    def _discount(discount_factor_bps, best_price: float, price: float) -> float:
+        # each cent behind the best bid discounts the reward by discount_factor_bps
+        ticks = max(0, round((best_price - price) * 100))
+        factor = 1 - float(discount_factor_bps or 0) / 10000
+        return max(0.0, factor) ** ticks
+
+    @staticmethod
+    def _score(period_reward: float, discount: float, queue_ahead: float, price: float, trade_size: float) -> float:
+        if price <= 0 or trade_size <= 0:
+            return 0.0
+        share = trade_size / (queue_ahead + trade_size)
+        return period_reward * discount * share / (price * trade_size)
+
+    def update(self, ticker: str, incentive: dict, best_price: float, price: float, queue_ahead: float, trade_size: float):
+        """Updates the score inputs of one market; unchanged inputs are not rescored."""
+        inputs = (incentive['period_reward'], incentive['discount_factor_bps'], best_price, price, queue_ahead, trade_size)
+        row = self.rows.get(ticker)
+        if row is not None and self.inputs[row] == inputs:
+            return self.scores[row]
+
+        period_reward = float(incentive['period_reward'] or 0)
+        discount = self._discount(incentive['discount_factor_bps'], best_price, price)
+        score = self._score(period_reward, discount, queue_ahead, price, trade_size)
+        if row is None:
+            self.rows[ticker] = len(self.tickers)
+            self.tickers.append(ticker)
+            self.price.append(price)
+            self.trade_size.append(trade_size)
+            self.scores.append(score)
+            self.inputs.append(inputs)
+        else:
+            self.price[row] = price
+            self.trade_size[row] = trade_size
+            self.scores[row] = score
+            self.inputs[row] = inputs
+        return score
+
+    def remove(self, ticker: str):
+        """Drops a market, moving the last row into its slot."""
+        row = self.rows.pop(ticker, None)
+        if row is None:
+            return
+        last = len(self.tickers) - 1
+        for column in (self.tickers, self.price, self.trade_size, self.scores, self.inputs):
+            column[row] = column[last]
+            column.pop()
+        if row != last:
+            self.rows[self.tickers[row]] = row
+
+    def get_score(self, ticker: str) -> float:
+        row = self.rows.get(ticker)
+        return self.scores[row] if row is not None else 0.0
+
+    def expected_reward(self, ticker: str) -> float:
+        """Returns the estimated reward of one full program period for the market."""
+        row = self.rows.get(ticker)
+        if row is None:
+            return 0.0
+        return self.scores[row] * self.price[row] * self.trade_size[row]
+
+    def top_k(self, tickers: list, k: int) -> list:
+        """Returns up to k of the given tickers with the highest score."""
+        return heapq.nlargest(k, tickers, key=self.get_score)
@@ -0,0 +1,75 @@
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from incentive import INCENTIVE_PROGRAM
+
+
+@pytest.fixture
+def incentive_program():
+    INCENTIVE_PROGRAM._INCENTIVE_PROGRAM__instance = None
+    incentive_program = INCENTIVE_PROGRAM()
+    incentive_program.stop_trade_time = 60
+    return incentive_program
+
+
+def iso(hours: float):
+    return (datetime.now(timezone.utc) + timedelta(hours=hours)).isoformat()
+
+
+def program(incentive_id: str, ticker: str, start_hours: float = -1, end_hours: float = 24, paid_out: bool = False):
+    return {
+        'id': incentive_id,
+        'market_ticker': ticker,
+        'incentive_type': 'liquidity',
+        'paid_out': paid_out,
+        'start_date': iso(start_hours),
+        'end_date': iso(end_hours),
+        'period_reward': 100,
+        'discount_factor_bps': 500,
+        'target_size': 100,
+    }
+
+
+def test_program_missing_from_listing_is_dropped(incentive_program):
+    incentive_program.load_market_incentive([program('A', 'T-A')])
+    incentive_program.load_market_incentive([program('B', 'T-B')])
+
+    assert incentive_program.get_open_incentive_tickers() == ['T-B']
+    assert set(incentive_program.programs) == {'B'}
+
+
+def test_shortened_end_date_reschedules_expiry(incentive_program):
+    incentive = program('A', 'T-A')
+    incentive_program.load_market_incentive([incentive])
+    shortened = {**incentive, 'end_date': iso(1)}
+    incentive_program.load_market_incentive([shortened])
+
+    now = datetime.now(timezone.utc).timestamp()
+    assert incentive_program.process_events(now + 2 * 3600) == ['T-A']
+    assert not incentive_program.is_incentivized('T-A')
+
+
+def test_paid_out_program_is_dropped(incentive_program):
+    incentive = program('A', 'T-A')
+    incentive_program.load_market_incentive([incentive])
+    incentive_program.load_market_incentive([{**incentive, 'paid_out': True}])
+
+    assert not incentive_program.is_incentivized('T-A')
+
+
+def test_pending_program_starts_and_stale_entries_are_skipped(incentive_program):
+    incentive = program('A', 'T-A', start_hours=1)
+    incentive_program.load_market_incentive([incentive])
+    # moved later: the first start entry is stale
+    incentive_program.load_market_incentive([{**incentive, 'start_date': iso(2)}])
+
+    now = datetime.now(timezone.utc).timestamp()
+    incentive_program.process_events(now + 1.5 * 3600)
+    assert not incentive_program.is_incentivized('T-A')
+    incentive_program.process_events(now + 2.5 * 3600)
+    assert incentive_program.is_incentivized('T-A')
@@ -0,0 +1,68 @@
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from journal import JOURNAL
+
+
+@pytest.fixture
+def journal(tmp_path):
+    journal = JOURNAL(str(tmp_path / "journal.db"))
+    yield journal
+    journal.close()
+
+
+def test_abandoned_intent_is_dropped_on_replay_and_compact(journal):
+    journal.record_intent('client-1', {'client_order_id': 'client-1', 'ticker': 'KXTEST-26JAN16-B1'})
+    journal.record_intent('client-2', {'client_order_id': 'client-2', 'ticker': 'KXTEST-26JAN16-B2'})
+    journal.record_abandon('client-1')
+
+    assert list(journal.replay()['intents']) == ['client-2']
+    journal.compact()
+    assert list(journal.replay()['intents']) == ['client-2']
+
+
+def test_filled_order_is_dropped_on_replay(journal):
+    journal.record_ack({'order_id': 'order-1', 'ticker': 'T-1', 'status': 'resting', 'fill_count': 1, 'remaining_count': 2})
+    journal.record_fill({'order_id': 'order-1', 'trade_id': 'trade-1', 'count': 1})
+    assert list(journal.replay()['orders']) == ['order-1']
+
+    journal.record_fill({'order_id': 'order-1', 'trade_id': 'trade-2', 'count': 1})
+    assert journal.replay()['orders'] == {}
+
+
+def test_reconcile_prunes_orders_and_intents(journal):
+    journal.record_ack({'order_id': 'order-1', 'ticker': 'T-1', 'status': 'resting', 'count': 5})
+    journal.record_ack({'order_id': 'order-2', 'ticker': 'T-2', 'status': 'resting', 'count': 5})
+    journal.record_intent('client-3', {'client_order_id': 'client-3', 'ticker': 'T-3'})
+
+    journal.record_reconcile(['order-2'])
+
+    state = journal.replay()
+    assert list(state['orders']) == ['order-2']
+    assert state['intents'] == {}
+
+
+def test_compact_keeps_events_appended_while_it_runs(journal):
+    journal.record_ack({'order_id': 'order-1', 'ticker': 'T-1', 'status': 'resting', 'count': 5})
+    replay = journal._replay
+    threads = []
+
+    def replay_then_fill():
+        state = replay()
+        # a stream-thread fill arriving mid-compaction waits for the snapshot
+        thread = threading.Thread(target=journal.record_fill, args=({'order_id': 'order-1', 'trade_id': 'trade-1', 'count': 2},))
+        thread.start()
+        threads.append(thread)
+        return state
+
+    journal._replay = replay_then_fill
+    journal.compact()
+    journal._replay = replay
+    threads[0].join()
+
+    assert journal.replay()['orders']['order-1']['fill_count'] == 2
@@ -0,0 +1,40 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from market_data import MARKET_DATA_CACHE, MARKET_DATA_WRITER
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "market_data")
+
+
+def test_reader_follows_a_restarted_writer_with_a_smaller_file(path):
+    writer = MARKET_DATA_WRITER(path, capacity=1 << 20)
+    writer.write({'ts': 1})
+    cache = MARKET_DATA_CACHE(path)
+    assert cache.read() == {'ts': 1}
+    mapped_size = len(cache.mm)
+
+    # the old file is replaced, not truncated under the reader's mapping
+    restarted = MARKET_DATA_WRITER(path, capacity=1024)
+    assert os.path.getsize(path) < mapped_size
+    assert len(cache.mm) == mapped_size
+    restarted.write({'ts': 2})
+
+    assert cache.read() == {'ts': 2}
+    assert len(cache.mm) == os.path.getsize(path)
+    assert os.listdir(os.path.dirname(path)) == ['market_data']
+    writer.close()
+    restarted.close()
+    cache.close()
+
+
+def test_reader_without_a_daemon_returns_none(path):
+    cache = MARKET_DATA_CACHE(path)
+
+    assert cache.read() is None
@@ -0,0 +1,75 @@
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from portfolio import PORTFOLIO
+
+
+@pytest.fixture
+def portfolio():
+    PORTFOLIO._PORTFOLIO__instance = None
+    return PORTFOLIO()
+
+
+def resting_order(order_id: str, count: int, fill_count: int):
+    return {
+        'order_id': order_id,
+        'ticker': 'KXTEST-26JAN16-B1',
+        'side': 'yes',
+        'action': 'buy',
+        'status': 'resting',
+        'yes_price_dollars': '0.1000',
+        'count': count,
+        'fill_count': fill_count,
+        'remaining_count': count - fill_count,
+    }
+
+
+def fill_message(order_id: str, trade_id: str, count: int):
+    return json.dumps({'type': 'fill', 'msg': {
+        'order_id': order_id,
+        'trade_id': trade_id,
+        'market_ticker': 'KXTEST-26JAN16-B1',
+        'side': 'yes',
+        'action': 'buy',
+        'count': count,
+    }})
+
+
+def test_fill_after_reconcile_is_applied(portfolio):
+    positions = [{'ticker': 'KXTEST-26JAN16-B1', 'position': 3}]
+    portfolio.reconcile(positions, [resting_order('order-1', 10, 3)], 10000)
+
+    portfolio.on_ws_message(fill_message('order-1', 'trade-4', 2))
+
+    assert portfolio.get_positions() == {'KXTEST-26JAN16-B1': 5}
+    assert portfolio.balance == 10000 - 2 * 10
+
+
+def test_late_fill_of_closed_order_is_not_applied_twice(portfolio):
+    closed = resting_order('order-2', 5, 5)
+    closed['status'] = 'executed'
+    closed['remaining_count'] = 0
+    portfolio.apply_order_response(closed)
+    assert portfolio.get_positions() == {'KXTEST-26JAN16-B1': 5}
+
+    # the REST snapshot already includes the fills of the closed order
+    portfolio.reconcile([{'ticker': 'KXTEST-26JAN16-B1', 'position': 5}], [], 10000)
+    portfolio.on_ws_message(fill_message('order-2', 'trade-1', 5))
+
+    assert portfolio.get_positions() == {'KXTEST-26JAN16-B1': 5}
+
+
+def test_fully_filled_order_stops_resting(portfolio):
+    portfolio.reconcile([], [resting_order('order-3', 4, 1)], 10000)
+
+    portfolio.on_ws_message(fill_message('order-3', 'trade-2', 3))
+
+    assert portfolio.get_positions() == {'KXTEST-26JAN16-B1': 3}
+    assert portfolio.get_resting_orders() == []
+    assert portfolio.get_exposure('KXTEST-26JAN16-B1')[0] == 3
+    assert portfolio.available_balance() == 10000 - 3 * 10
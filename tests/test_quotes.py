@@ -0,0 +1,86 @@
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from quotes import QUOTE_MANAGER
+
+
+@pytest.fixture
+def quotes():
+    return QUOTE_MANAGER(tick=1.0, slots=8)
+
+
+def quote_order(order_id: str, ticker: str, price: str = '0.1000'):
+    return {'order_id': order_id, 'ticker': ticker, 'side': 'yes', 'yes_price_dollars': price}
+
+
+def test_advance_past_a_full_turn_returns_every_due_quote(quotes):
+    quotes.add(quote_order('order-1', 'T-1'), 3)
+    quotes.add(quote_order('order-2', 'T-2'), 6)
+
+    due = quotes.advance(time.monotonic() + 3 * quotes.slots)
+
+    assert sorted(quote['order_id'] for quote in due) == ['order-1', 'order-2']
+    assert quotes.advance(time.monotonic() + 4 * quotes.slots) == []
+
+
+def test_quote_is_not_due_before_its_deadline(quotes):
+    quotes.add(quote_order('order-1', 'T-1'), 5)
+
+    assert quotes.advance(time.monotonic() + 2) == []
+    assert [quote['order_id'] for quote in quotes.advance(time.monotonic() + 7)] == ['order-1']
+
+
+def test_reschedule_before_the_deadline_moves_the_quote(quotes):
+    quotes.add(quote_order('order-1', 'T-1'), 2)
+    quotes.reschedule('order-1', 20)
+
+    assert quotes.advance(time.monotonic() + 5) == []
+    assert [quote['order_id'] for quote in quotes.advance(time.monotonic() + 25)] == ['order-1']
+
+
+def test_reschedule_of_a_due_quote_puts_it_back_on_the_wheel(quotes):
+    quotes.add(quote_order('order-1', 'T-1'), 1)
+    now = time.monotonic() + 2
+    due = quotes.advance(now)
+    assert not due[0]['scheduled']
+
+    quotes.reschedule('order-1', 10)
+
+    assert due[0]['scheduled']
+    assert quotes.next_deadline() == pytest.approx(time.monotonic() + 10, abs=1)
+    assert [quote['order_id'] for quote in quotes.advance(time.monotonic() + 12)] == ['order-1']
+
+
+def test_remove_of_a_due_quote_forgets_it(quotes):
+    quotes.add(quote_order('order-1', 'T-1'), 1)
+    quotes.advance(time.monotonic() + 2)
+
+    quotes.remove('order-1')
+
+    assert not quotes.is_managed('order-1')
+    assert quotes.get_ticker_quote('T-1') is None
+    assert quotes.next_deadline() is None
+    assert quotes.advance(time.monotonic() + 3 * quotes.slots) == []
+
+
+def test_next_deadline_ignores_quotes_off_the_wheel(quotes):
+    quotes.add(quote_order('order-1', 'T-1'), 1)
+    quotes.add(quote_order('order-2', 'T-2'), 30)
+
+    quotes.advance(time.monotonic() + 2)
+
+    assert quotes.next_deadline() == quotes.get_ticker_quote('T-2')['deadline']
+
+
+def test_new_quote_on_a_ticker_replaces_the_old_one(quotes):
+    quotes.add(quote_order('order-1', 'T-1'), 1)
+    quotes.add(quote_order('order-2', 'T-1', '0.2000'), 30)
+
+    assert not quotes.is_managed('order-1')
+    assert quotes.get_ticker_quote('T-1')['price'] == 0.2
+    assert quotes.advance(time.monotonic() + 2) == []
@@ -0,0 +1,105 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from portfolio import PORTFOLIO
+from risk import RISK_ENGINE
+
+
+@pytest.fixture
+def portfolio():
+    PORTFOLIO._PORTFOLIO__instance = None
+    return PORTFOLIO()
+
+
+def make_risk(portfolio, ticker_limit=10, event_limit=15, total_limit=20, order_rate=100, price_band=0.05):
+    return RISK_ENGINE(portfolio, ticker_limit, event_limit, total_limit, order_rate, price_band)
+
+
+def opening_order(ticker='KXTEST-26JAN16-B1', count=5, price='0.1000', best_bid=0.10, other_bid=0.80):
+    return {
+        'ticker': ticker,
+        'side': 'yes',
+        'count': count,
+        'yes_price_dollars': price,
+        'market_yes_price': best_bid,
+        'market_no_price': other_bid,
+    }
+
+
+def test_ticker_limit_counts_pending_exposure(portfolio):
+    risk = make_risk(portfolio)
+
+    assert risk.check_order(opening_order(count=6)) is None
+    assert risk.check_order(opening_order(count=5)) == "ticker exposure limit 10"
+    assert risk.check_order(opening_order(count=4)) is None
+
+
+def test_ticker_limit_counts_portfolio_exposure(portfolio):
+    portfolio.reconcile([{'ticker': 'KXTEST-26JAN16-B1', 'position': -8}], [], 10000)
+    risk = make_risk(portfolio)
+
+    assert risk.check_order(opening_order(count=3)) == "ticker exposure limit 10"
+    assert risk.check_order(opening_order(count=2)) is None
+
+
+def test_event_limit_spans_the_markets_of_an_event(portfolio):
+    risk = make_risk(portfolio)
+
+    assert risk.check_order(opening_order('KXTEST-26JAN16-B1', count=8)) is None
+    assert risk.check_order(opening_order('KXTEST-26JAN16-B2', count=8)) == "event exposure limit 15"
+    assert risk.check_order(opening_order('KXOTHER-26JAN16-B2', count=8)) is None
+
+
+def test_total_limit_spans_events(portfolio):
+    risk = make_risk(portfolio)
+
+    assert risk.check_order(opening_order('KXA-26JAN16-B1', count=10)) is None
+    assert risk.check_order(opening_order('KXB-26JAN16-B1', count=10)) is None
+    assert risk.check_order(opening_order('KXC-26JAN16-B1', count=1)) == "total exposure limit 20"
+
+
+def test_token_bucket_refills(portfolio):
+    risk = make_risk(portfolio, ticker_limit=100, event_limit=100, total_limit=100, order_rate=2)
+
+    assert risk.check_order(opening_order(count=1)) is None
+    assert risk.check_order(opening_order(count=1)) is None
+    assert risk.check_order(opening_order(count=1)) == "order rate limit 2/s"
+
+    # half a second refills one token at 2 orders/s
+    risk.last_refill -= 0.5
+    assert risk.check_order(opening_order(count=1)) is None
+    assert risk.check_order(opening_order(count=1)) == "order rate limit 2/s"
+
+
+def test_rejected_orders_take_no_token(portfolio):
+    risk = make_risk(portfolio, order_rate=1)
+
+    assert risk.check_order(opening_order(count=11)) == "ticker exposure limit 10"
+    assert risk.check_order(opening_order(count=1)) is None
+
+
+def test_price_band_and_crossing_rejections(portfolio):
+    risk = make_risk(portfolio)
+
+    assert risk.check_order(opening_order(price='0.0400', best_bid=0.10)) == "price 0.0400 more than 0.05 from best bid 0.1000"
+    # best yes ask is 1 - 0.88 = 0.12
+    assert risk.check_order(opening_order(price='0.1200', best_bid=0.10, other_bid=0.88)) == "price 0.1200 crosses best ask 0.1200"
+    assert risk.check_order(opening_order(price='0.0000', best_bid=0.01)) == "price 0.0000 outside (0, 1)"
+    assert risk.check_order(opening_order(price='0.1100', best_bid=0.10, other_bid=0.88)) is None
+
+
+def test_release_order_restores_capacity(portfolio):
+    risk = make_risk(portfolio)
+    order = opening_order(count=10)
+
+    assert risk.check_order(order) is None
+    assert risk.check_order(opening_order(count=1)) == "ticker exposure limit 10"
+
+    risk.release_order(order)
+
+    assert (risk.pending_ticker, risk.pending_event, risk.pending_total) == ({}, {}, 0)
+    assert risk.check_order(opening_order(count=10)) is None
@@ -0,0 +1,74 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from trade import TRADE
+
+
+@pytest.fixture
+def trade():
+    TRADE._TRADE__instance = None
+    trade = TRADE()
+    trade.unwind_max_levels = 3
+    trade.unwind_max_slippage = 0.05
+    return trade
+
+
+def book(yes_levels=None, no_levels=None):
+    # levels as the API sends them: ascending price, best bid last
+    return {'yes_dollars': yes_levels, 'no_dollars': no_levels}
+
+
+def child_orders(close_orders):
+    return [(order['side'], order['count'], order[f"{order['side']}_price_dollars"]) for order in close_orders]
+
+
+def test_long_yes_sells_yes_from_the_best_bid_down(trade):
+    order_books = {'T-1': book(yes_levels=[['0.3800', 10], ['0.3900', 4], ['0.4000', 3]])}
+
+    close_orders, skipped = trade.create_close_orders({'T-1': 9}, order_books)
+
+    assert child_orders(close_orders) == [('yes', 3, '0.4000'), ('yes', 4, '0.3900'), ('yes', 2, '0.3800')]
+    assert all(order['action'] == 'sell' and order['reduce_only'] for order in close_orders)
+    assert all(order['time_in_force'] == 'immediate_or_cancel' for order in close_orders)
+    assert skipped == []
+
+
+def test_long_no_sells_no(trade):
+    order_books = {'T-1': book(yes_levels=[['0.4000', 50]], no_levels=[['0.5500', 50]])}
+
+    close_orders, _ = trade.create_close_orders({'T-1': -5}, order_books)
+
+    assert child_orders(close_orders) == [('no', 5, '0.5500')]
+
+
+def test_depth_cap_stops_the_walk(trade):
+    trade.unwind_max_levels = 2
+    order_books = {'T-1': book(yes_levels=[['0.3800', 10], ['0.3900', 1], ['0.4000', 1]])}
+
+    close_orders, _ = trade.create_close_orders({'T-1': 5}, order_books)
+
+    assert child_orders(close_orders) == [('yes', 1, '0.4000'), ('yes', 1, '0.3900')]
+
+
+def test_slippage_floor_stops_the_walk(trade):
+    order_books = {'T-1': book(yes_levels=[['0.3000', 10], ['0.3600', 1], ['0.4000', 1]])}
+
+    close_orders, _ = trade.create_close_orders({'T-1': 5}, order_books)
+
+    assert child_orders(close_orders) == [('yes', 1, '0.4000'), ('yes', 1, '0.3600')]
+
+
+def test_positions_without_a_bid_are_skipped(trade):
+    order_books = {
+        'T-1': book(yes_levels=None, no_levels=[['0.5000', 5]]),
+        'T-2': book(yes_levels=[['0.2000', 5]]),
+    }
+
+    close_orders, skipped = trade.create_close_orders({'T-1': 2, 'T-3': -1, 'T-2': 0}, order_books)
+
+    assert close_orders == []
+    assert skipped == ['T-1', 'T-3']
@@ -1,6 +1,7 @@
-from datetime import datetime, timedelta
 import time
 
+from clock import EXCHANGE_CLOCK
+
 class TRADE:
 
     __instance = None
@@ -53,6 +54,38 @@ class TRADE:
     def minimum_market_price_delta(self, value: float):
         self.__minimum_market_price_delta = value
 
+    @property
+    def portfolio(self):
+        return self.__portfolio
+
+    @portfolio.setter
+    def portfolio(self, value):
+        self.__portfolio = value
+
+    @property
+    def scorer(self):
+        return self.__scorer
+
+    @scorer.setter
+    def scorer(self, value):
+        self.__scorer = value
+
+    @property
+    def unwind_max_levels(self):
+        return self.__unwind_max_levels
+
+    @unwind_max_levels.setter
+    def unwind_max_levels(self, value: int):
+        self.__unwind_max_levels = value
+
+    @property
+    def unwind_max_slippage(self):
+        return self.__unwind_max_slippage
+
+    @unwind_max_slippage.setter
+    def unwind_max_slippage(self, value: float):
+        self.__unwind_max_slippage = value
+
     def get_balance(self, balance: int):
         self.balance = balance
 
@@ -73,6 +106,68 @@ class TRADE:
         return max(0, len(reverse_cum) - 1)
 
 
+    def price_quote(self, ticker: str, incentive: dict, market_book: dict):
+        """Prices the quote for one market, or returns None if it does not qualify."""
+        if market_book['yes_dollars'] is None or market_book['no_dollars'] is None:
+            return None
+        yes_book = self._reverse_cum(market_book['yes_dollars'])
+        no_book = self._reverse_cum(market_book['no_dollars'])
+        yes_idx = self._find_the_last_price_and_qty(yes_book, incentive['target_size'])
+        no_idx = self._find_the_last_price_and_qty(no_book, incentive['target_size'])
+        market_yes_price = float(yes_book[0][0])
+        market_no_price = float(no_book[0][0])
+        yes_price = float(yes_book[yes_idx][0])
+        yes_qty = float(yes_book[yes_idx][1])
+        no_price = float(no_book[no_idx][0])
+        no_qty = float(no_book[no_idx][1])
+        price = min(yes_price, no_price)
+        market_yes_price_delta = float(market_yes_price) - float(yes_price)
+        market_no_price_delta = float(market_no_price) - float(no_price)
+
+        if yes_qty > incentive['target_size'] and no_qty > incentive['target_size']:
+            self.scorer.remove(ticker)
+            return None
+
+        price_name = 'yes_price_dollars' if yes_price < no_price else 'no_price_dollars'
+
+        if price_name == 'yes_price_dollars' and yes_qty > incentive['target_size']:
+            self.scorer.remove(ticker)
+            return None
+        if price_name == 'no_price_dollars' and no_qty > incentive['target_size']:
+            self.scorer.remove(ticker)
+            return None
+        if price_name == 'yes_price_dollars' and (yes_price < self.trade_price_range[0] or yes_price > self.trade_price_range[1] or market_yes_price_delta < float(self.minimum_market_price_delta)):
+            self.scorer.remove(ticker)
+            return None
+        if price_name == 'no_price_dollars' and (no_price < self.trade_price_range[0] or no_price > self.trade_price_range[1] or market_no_price_delta < float(self.minimum_market_price_delta)):
+            self.scorer.remove(ticker)
+            return None
+
+        if price_name == 'yes_price_dollars':
+            self.scorer.update(ticker, incentive, market_yes_price, yes_price, yes_qty, float(self.trade_size))
+        else:
+            self.scorer.update(ticker, incentive, market_no_price, no_price, no_qty, float(self.trade_size))
+
+        order = {
+            'ticker': ticker,
+            'side': 'yes' if yes_price < no_price else 'no',
+            price_name: f"{price:.4f}",
+            'price': price,
+            'price_name': price_name,
+            'target_size': incentive['target_size'],
+            'title': incentive['title'],
+            'rules_primary': incentive['rules_primary'],
+            'yes_qty': yes_qty,
+            'no_qty': no_qty,
+            'yes_price': yes_price,
+            'no_price': no_price,
+            'market_yes_price': market_yes_price,
+            'market_no_price': market_no_price,
+            'market_yes_price_delta': market_yes_price_delta,
+            'market_no_price_delta': market_no_price_delta,
+        }
+        return order
+
     def prepare_open_order(self,
             order_book: dict,
             order_market_book: dict,
@@ -80,83 +175,63 @@ class TRADE:
 
         for ticker in order_book:
             if ticker in order_market_book:
-                
-                if order_market_book[ticker]['yes_dollars'] is None or order_market_book[ticker]['no_dollars'] is None:
-                    continue
-                yes_book = self._reverse_cum(order_market_book[ticker]['yes_dollars'])
-                no_book = self._reverse_cum(order_market_book[ticker]['no_dollars'])
-                yes_idx = self._find_the_last_price_and_qty(yes_book, order_book[ticker]['target_size'])
-                no_idx = self._find_the_last_price_and_qty(no_book, order_book[ticker]['target_size'])
-                market_yes_price = float(yes_book[0][0])
-                market_no_price = float(no_book[0][0])
-                yes_price = float(yes_book[yes_idx][0])
-                yes_qty = float(yes_book[yes_idx][1])
-                no_price = float(no_book[no_idx][0])
-                no_qty = float(no_book[no_idx][1])
-                price = min(yes_price, no_price)
-                market_yes_price_delta = float(market_yes_price) - float(yes_price)
-                market_no_price_delta = float(market_no_price) - float(no_price)
-
-                if yes_qty > order_book[ticker]['target_size'] and no_qty > order_book[ticker]['target_size']:
-                    continue
+                order = self.price_quote(ticker, order_book[ticker], order_market_book[ticker])
+                if order is not None:
+                    self.open_trade_orders[ticker] = order
 
-                price_name = 'yes_price_dollars' if yes_price < no_price else 'no_price_dollars'
+        # highest expected reward per dollar at risk first
+        top_tickers = self.scorer.top_k(list(self.open_trade_orders.keys()), self.open_position_max)
+        self.open_trade_orders = {ticker: self.open_trade_orders[ticker] for ticker in top_tickers}
 
-                if price_name == 'yes_price_dollars' and yes_qty > order_book[ticker]['target_size']:
-                    continue
-                if price_name == 'no_price_dollars' and no_qty > order_book[ticker]['target_size']:
-                    continue
-                if price_name == 'yes_price_dollars' and (yes_price < self.trade_price_range[0] or yes_price > self.trade_price_range[1] or market_yes_price_delta < float(self.minimum_market_price_delta)):
-                    continue
-                if price_name == 'no_price_dollars' and (no_price < self.trade_price_range[0] or no_price > self.trade_price_range[1] or market_no_price_delta < float(self.minimum_market_price_delta)):
-                    continue
-
-                order = {
-                    'ticker': ticker,
-                    'side': 'yes' if yes_price < no_price else 'no',
-                    price_name: f"{price:.4f}",
-                    'price': price,
-                    'price_name': price_name,
-                    'target_size': order_book[ticker]['target_size'],
-                    'title': order_book[ticker]['title'],
-                    'rules_primary': order_book[ticker]['rules_primary'],
-                    'yes_qty': yes_qty,
-                    'no_qty': no_qty,
-                    'yes_price': yes_price,
-                    'no_price': no_price,
-                    'market_yes_price': market_yes_price,
-                    'market_no_price': market_no_price,
-                    'market_yes_price_delta': market_yes_price_delta,
-                    'market_no_price_delta': market_no_price_delta,
-                }
+    def reprice_open_orders(self, order_book: dict, order_market_book: dict):
+        """Re-prices the selected markets in place; returns the tickers that no longer qualify."""
+        dropped = []
+        for ticker in list(self.open_trade_orders.keys()):
+            if ticker not in order_book or ticker not in order_market_book:
+                continue
+            order = self.price_quote(ticker, order_book[ticker], order_market_book[ticker])
+            if order is None:
+                self.open_trade_orders.pop(ticker)
+                dropped.append(ticker)
+            else:
                 self.open_trade_orders[ticker] = order
-        
-        sorted_items = sorted(self.open_trade_orders.items(), key=lambda x: x[1]['price'])[:self.open_position_max]
-        self.open_trade_orders = dict(sorted_items)
+        return dropped
 
     def get_open_trade_orders(self):
         return self.open_trade_orders
 
     def check_open_order_expiration(self, incentive_dict: dict):
-        for ticker, _ in self.open_trade_orders.items():
+        for ticker in list(self.open_trade_orders.keys()):
             if ticker not in incentive_dict:
                 self.open_trade_orders.pop(ticker)
 
+    def expire_tickers(self, tickers: list):
+        for ticker in tickers:
+            self.open_trade_orders.pop(ticker, None)
+
     def has_open_position(self):
         return len(self.open_trade_orders) > 0
 
-    def create_open_order(self):
-        if self.balance <= 0:
+    def create_open_order(self, tickers: list = None):
+        """Builds limit orders for the selected markets (or only the given tickers)."""
+        # balance is tracked locally in cents, net of cash reserved for in-flight orders
+        available_balance = self.portfolio.available_balance()
+        if available_balance <= 0:
             raise ValueError("Insufficient balance")
             return
 
         market_orders = []
         for key, order in self.open_trade_orders.items():
-            if order['price'] * float(self.trade_size) < self.balance:
+            if tickers is not None and key not in tickers:
+                continue
+            order_cost = int(round(order['price'] * 100)) * int(self.trade_size)
+            if order_cost < available_balance:
+                available_balance -= order_cost
+                self.portfolio.reserve(f"pending:{key}", order_cost)
                 # no incentive for the no bid price
                 # API expects no_price_dollars as a string with 4 decimal places
                 # When expiration_ts is provided, time_in_force should be omitted
-                expiration_ts = int((datetime.now() + timedelta(seconds=self.expiration_ts)).timestamp())
+                expiration_ts = int(EXCHANGE_CLOCK().now() + self.expiration_ts)
                 tmp_market_order = {
                     'ticker': key,
                     'side': order['side'],
@@ -180,3 +255,44 @@ class TRADE:
         
         return market_orders
 
+    def create_close_orders(self, positions: dict, order_market_book: dict):
+        """Splits each position exit into IOC child orders sized to the bid depth.
+
+        positions maps ticker to signed position count (positive = long yes,
+        negative = long no). Levels are walked from the best bid down, at most
+        unwind_max_levels deep and no further than unwind_max_slippage below the
+        best bid. Positions without a bid are returned in the skipped list.
+        """
+        close_orders = []
+        skipped = []
+        for ticker, position_count in positions.items():
+            if position_count == 0:
+                continue
+            side = 'yes' if position_count > 0 else 'no'
+            remaining = abs(position_count)
+            # yes_dollars are bid prices for yes, no_dollars are bid prices for no
+            bids = (order_market_book.get(ticker) or {}).get(f"{side}_dollars") or []
+            levels = sorted(((float(price), int(float(qty))) for price, qty in bids), reverse=True)
+            if not levels:
+                skipped.append(ticker)
+                continue
+
+            price_floor = levels[0][0] - float(self.unwind_max_slippage)
+            for price, qty in levels[:self.unwind_max_levels]:
+                if remaining <= 0 or price < price_floor:
+                    break
+                count = min(qty, remaining)
+                if count <= 0:
+                    continue
+                close_orders.append({
+                    'ticker': ticker,
+                    'side': side,
+                    'action': 'sell',
+                    'count': count,
+                    'type': 'limit',
+                    f"{side}_price_dollars": f"{price:.4f}",
+                    'time_in_force': 'immediate_or_cancel',
+                    'reduce_only': True,
+                })
+                remaining -= count
+        return close_orders, skipped